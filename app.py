@@ -5,6 +5,7 @@ from chatbot import sentiment
 
 app = Flask(__name__)
 bot=AdvancedBot()
+bot.warm_up(background=False)
 conv=ConversationManager()
 
 @app.route("/")
@@ -1,27 +1,59 @@
 import re
 import os
 import json
+import logging
 import random
+import queue
+import tempfile
+import threading
+import time
 import joblib
-from typing import List, Optional, Dict, Any, Tuple
-from datetime import datetime
+from collections import deque
+from concurrent.futures import Future
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Tuple, NamedTuple, Callable, Sequence
+from datetime import datetime, timezone
 import numpy as np
 import pandas as pd
 from sentence_transformers import SentenceTransformer, util
 from sklearn.linear_model import LogisticRegression
 from sklearn.preprocessing import LabelEncoder
 
+logger = logging.getLogger(__name__)
+
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # =============================
 # Configuration
 # =============================
 EMBED_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# model2vec distillation: token lookup + mean pooling, no transformer forward pass
+STATIC_EMBED_MODEL_NAME = "minishlab/potion-base-8M"
+USE_STATIC_EMBEDDER = False
+ACTIVE_EMBED_MODEL_NAME = STATIC_EMBED_MODEL_NAME if USE_STATIC_EMBEDDER else EMBED_MODEL_NAME
 ARTIFACTS_DIR = "bot_artifacts"
 CLASSIFIER_FILE = os.path.join(ARTIFACTS_DIR, "intent_clf.joblib")
 LABEL_ENCODER_FILE = os.path.join(ARTIFACTS_DIR, "label_encoder.joblib")
+CLASSIFIER_WEIGHTS_FILE = os.path.join(ARTIFACTS_DIR, "intent_clf.npz")
+LABEL_CLASSES_FILE = os.path.join(ARTIFACTS_DIR, "label_classes.npy")
 CENTROIDS_FILE = os.path.join(ARTIFACTS_DIR, "class_centroids.npy")
 CENTROID_LABELS_FILE = os.path.join(ARTIFACTS_DIR, "centroid_labels.json")
 EMBEDDER_NAME_FILE = os.path.join(ARTIFACTS_DIR, "embedder_name.txt")
 SOFTMAX_OOD_THRESHOLD = 0.45
+# On CUDA the embedder runs in fp16 if this sentence still embeds within FP16_MIN_COSINE of fp32
+FP16_SANITY_SENTENCE = "I have an exam tomorrow and I feel anxious."
+FP16_MIN_COSINE = 0.99
+# Set (to "1") by gunicorn.conf.py in a preloading master: CUDA initialized before fork
+# cannot be used by the workers, so the master loads on the CPU and each worker moves it
+EMBED_CPU_ONLY_ENV = "CHATBOT_EMBED_CPU_ONLY"
 COSINE_OOD_THRESHOLD = 0.55
 
 os.makedirs(ARTIFACTS_DIR, exist_ok=True)
@@ -29,40 +61,53 @@ os.makedirs(ARTIFACTS_DIR, exist_ok=True)
 # =============================
 # Emotion Patterns
 # =============================
-EMOTION_PATTERNS = {
+_RAW_EMOTION_PATTERNS = {
     # Negative emotions
-    "sad": r"\b(sad|depressed|down|unhappy|miserable|crying|heartbroken|gloomy|blue|tears|weeping)\b",
-    "angry": r"\b(angry|mad|furious|pissed|rage|annoyed|irritated|frustrated|livid|outraged)\b",
-    "anxious": r"\b(anxious|worried|nervous|stressed|overwhelmed|panic|tense|uneasy|restless|on edge)\b",
-    "lonely": r"\b(lonely|alone|isolated|nobody|no one cares|feel empty|abandoned|disconnected)\b",
-    "guilty": r"\b(guilty|ashamed|regret|fault|bad person|messed up|shouldn\'t have|feel terrible about)\b",
-    "jealous": r"\b(jealous|envious|envy|they have|wish i had|not fair|why them|comparing myself)\b",
-    "disappointed": r"\b(disappointed|let down|expected more|failed|didn\'t work out|upset about|bummed)\b",
-    "hurt": r"\b(hurt|wounded|betrayed|backstabbed|used|taken advantage|disrespected)\b",
-    "scared": r"\b(scared|afraid|terrified|fearful|frightened|paranoid|dread|horrified)\b",
-    "confused": r"\b(confused|lost|don\'t understand|unclear|puzzled|bewildered|mixed up|disoriented)\b",
-    "tired": r"\b(tired|exhausted|drained|burnt out|burnout|fatigue|no energy|can\'t anymore|worn out)\b",
-    "overwhelmed": r"\b(overwhelmed|too much|can\'t handle|drowning|suffocating|buried|swamped)\b",
-    "hopeless": r"\b(hopeless|no point|give up|pointless|nothing matters|no way out|can\'t see future)\b",
-    "insecure": r"\b(insecure|not good enough|inadequate|unworthy|don\'t deserve|not capable)\b",
+    "sad": r"\b(?:sad|depressed|down|unhappy|miserable|crying|heartbroken|gloomy|blue|tears|weeping)\b",
+    "angry": r"\b(?:angry|mad|furious|pissed|rage|annoyed|irritated|frustrated|livid|outraged)\b",
+    "anxious": r"\b(?:anxious|worried|nervous|stressed|overwhelmed|panic|tense|uneasy|restless|on edge)\b",
+    "lonely": r"\b(?:lonely|alone|isolated|nobody|no one cares|feel empty|abandoned|disconnected)\b",
+    "guilty": r"\b(?:guilty|ashamed|regret|fault|bad person|messed up|shouldn\'t have|feel terrible about)\b",
+    "jealous": r"\b(?:jealous|envious|envy|they have|wish i had|not fair|why them|comparing myself)\b",
+    "disappointed": r"\b(?:disappointed|let down|expected more|failed|didn\'t work out|upset about|bummed)\b",
+    "hurt": r"\b(?:hurt|wounded|betrayed|backstabbed|used|taken advantage|disrespected)\b",
+    "scared": r"\b(?:scared|afraid|terrified|fearful|frightened|paranoid|dread|horrified)\b",
+    "confused": r"\b(?:confused|lost|don\'t understand|unclear|puzzled|bewildered|mixed up|disoriented)\b",
+    "tired": r"\b(?:tired|exhausted|drained|burnt out|burnout|fatigue|no energy|can\'t anymore|worn out)\b",
+    "overwhelmed": r"\b(?:overwhelmed|too much|can\'t handle|drowning|suffocating|buried|swamped)\b",
+    "hopeless": r"\b(?:hopeless|no point|give up|pointless|nothing matters|no way out|can\'t see future)\b",
+    "insecure": r"\b(?:insecure|not good enough|inadequate|unworthy|don\'t deserve|not capable)\b",
 
     # Positive emotions
-    "happy": r"\b(happy|joy|joyful|cheerful|delighted|pleased|content|blessed|thrilled)\b",
-    "excited": r"\b(excited|thrilled|pumped|stoked|can\'t wait|eager|enthusiastic|amped|hyped)\b",
-    "proud": r"\b(proud|accomplished|achieved|nailed it|did it|success|won|victory|made it)\b",
-    "grateful": r"\b(grateful|thankful|blessed|appreciate|lucky|fortunate|privilege)\b",
-    "relieved": r"\b(relieved|relief|finally|glad it\'s over|off my chest|weight lifted|phew)\b",
-    "loved": r"\b(loved|appreciated|valued|cherished|supported|cared for|matter to someone)\b",
-    "hopeful": r"\b(hopeful|optimistic|looking forward|excited for|things will|get better|positive about)\b",
-    "confident": r"\b(confident|self-assured|can do|believe in myself|got this|ready|prepared)\b",
+    "happy": r"\b(?:happy|joy|joyful|cheerful|delighted|pleased|content|blessed|thrilled)\b",
+    "excited": r"\b(?:excited|thrilled|pumped|stoked|can\'t wait|eager|enthusiastic|amped|hyped)\b",
+    "proud": r"\b(?:proud|accomplished|achieved|nailed it|did it|success|won|victory|made it)\b",
+    "grateful": r"\b(?:grateful|thankful|blessed|appreciate|lucky|fortunate|privilege)\b",
+    "relieved": r"\b(?:relieved|relief|finally|glad it\'s over|off my chest|weight lifted|phew)\b",
+    "loved": r"\b(?:loved|appreciated|valued|cherished|supported|cared for|matter to someone)\b",
+    "hopeful": r"\b(?:hopeful|optimistic|looking forward|excited for|things will|get better|positive about)\b",
+    "confident": r"\b(?:confident|self-assured|can do|believe in myself|got this|ready|prepared)\b",
 
     # Neutral/Complex emotions
-    "bored": r"\b(bored|boring|nothing to do|dull|monotonous|uninteresting|restless|idle)\b",
-    "numb": r"\b(numb|empty|void|hollow|feel nothing|don\'t feel|emotionless|detached)\b",
-    "nostalgic": r"\b(nostalgic|miss|used to|remember when|back then|old days|memories)\b",
-    "curious": r"\b(curious|wonder|wondering|interested|want to know|question|intrigued)\b",
+    "bored": r"\b(?:bored|boring|nothing to do|dull|monotonous|uninteresting|restless|idle)\b",
+    "numb": r"\b(?:numb|empty|void|hollow|feel nothing|don\'t feel|emotionless|detached)\b",
+    "nostalgic": r"\b(?:nostalgic|miss|used to|remember when|back then|old days|memories)\b",
+    "curious": r"\b(?:curious|wonder|wondering|interested|want to know|question|intrigued)\b",
 }
 
+EMOTION_PATTERNS = {k: re.compile(v, re.IGNORECASE) for k, v in _RAW_EMOTION_PATTERNS.items()}
+
+# Winner order when several emotions match: negatives first, then the rest in dict order
+_NEGATIVE_FIRST = ["sad", "angry", "anxious", "lonely", "guilty", "hurt", "scared",
+                   "disappointed", "overwhelmed", "hopeless", "insecure", "numb"]
+EMOTION_PRIORITY = _NEGATIVE_FIRST + [e for e in _RAW_EMOTION_PATTERNS if e not in _NEGATIVE_FIRST]
+
+# Emotions that lower / raise the mood score ("numb" is detected first but leaves the mood alone)
+NEGATIVE_EMOTIONS = frozenset({"sad", "angry", "anxious", "lonely", "guilty", "hurt", "scared",
+                               "disappointed", "overwhelmed", "hopeless", "insecure"})
+POSITIVE_EMOTIONS = frozenset({"happy", "excited", "proud", "grateful", "relieved", "loved", "hopeful", "confident"})
+EMOTION_KEYS = frozenset(EMOTION_PATTERNS)
+
 # Intensity modifiers
 INTENSITY_MODIFIERS = {
     "very": 2.0,
@@ -77,78 +122,428 @@ INTENSITY_MODIFIERS = {
     "kinda": 0.7,
 }
 
+# One alternation of lookaheads finds every modifier (overlaps included) in a single pass
+_INTENSITY_WORDS = list(INTENSITY_MODIFIERS)
+_INTENSITY_RE = re.compile("|".join(f"(?=({re.escape(word)}))" for word in _INTENSITY_WORDS))
+
 # =============================
 # Priority Intents
 # =============================
-PRIORITY_INTENTS = {
-    "self_harm": r"\b(kill myself|suicide|end my life|want to die|self harm|hurt myself|don\'t want to live)\b",
-    "greeting": r"\b(hi|hello|hey|namaste|good morning|good evening|yo|sup|wassup|hola)\b",
-    "bye": r"\b(bye|goodbye|see you|take care|farewell|gotta go|later)\b",
-    "thanks": r"\b(thanks?|thank you|appreciate|tyvm|grateful|thx)\b",
-    "insult": r"\b(stupid|idiot|you suck|dumb|trash|worthless|useless|shut up)\b",
+_RAW_PRIORITY_INTENTS = {
+    "self_harm": r"\b(?:kill myself|suicide|end my life|want to die|self harm|hurt myself|don\'t want to live)\b",
+    "greeting": r"\b(?:hi|hello|hey|namaste|good morning|good evening|yo|sup|wassup|hola)\b",
+    "bye": r"\b(?:bye|goodbye|see you|take care|farewell|gotta go|later)\b",
+    "thanks": r"\b(?:thanks?|thank you|appreciate|tyvm|grateful|thx)\b",
+    "insult": r"\b(?:stupid|idiot|you suck|dumb|trash|worthless|useless|shut up)\b",
 }
 
+PRIORITY_INTENTS = {k: re.compile(v, re.IGNORECASE) for k, v in _RAW_PRIORITY_INTENTS.items()}
+
 # =============================
 # Context-Specific Patterns
 # =============================
-CONTEXT_PATTERNS = {
-    "breakup": r"\b(broke up|breakup|break up|left me|dumped|ended things|relationship ended|girlfriend left|boyfriend left|ex girlfriend|ex boyfriend|we\'re done|she left|he left)\b",
-    "family_issue": r"\b(parents|mom|dad|family|sibling|brother|sister|fight with|argument with family)\b",
-    "academic_stress": r"\b(exam|test|assignment|project|grade|marks|fail|study|course|professor|teacher)\b",
-    "job_stress": r"\b(job|work|boss|colleague|interview|fired|quit|promotion|salary|career)\b",
-    "health": r"\b(sick|ill|health|doctor|hospital|pain|disease|diagnosis)\b",
-    "financial": r"\b(money|broke|debt|loan|bills|afford|financial|income|expense)\b",
+_RAW_CONTEXT_PATTERNS = {
+    "breakup": r"\b(?:broke up|breakup|break up|left me|dumped|ended things|relationship ended|girlfriend left|boyfriend left|ex girlfriend|ex boyfriend|we\'re done|she left|he left)\b",
+    "family_issue": r"\b(?:parents|mom|dad|family|sibling|brother|sister|fight with|argument with family)\b",
+    "academic_stress": r"\b(?:exam|test|assignment|project|grade|marks|fail|study|course|professor|teacher)\b",
+    "job_stress": r"\b(?:job|work|boss|colleague|interview|fired|quit|promotion|salary|career)\b",
+    "health": r"\b(?:sick|ill|health|doctor|hospital|pain|disease|diagnosis)\b",
+    "financial": r"\b(?:money|broke|debt|loan|bills|afford|financial|income|expense)\b",
+}
+
+CONTEXT_PATTERNS = {k: re.compile(v, re.IGNORECASE) for k, v in _RAW_CONTEXT_PATTERNS.items()}
+
+# Topic heuristics used by predict_intent when no priority intent fires
+_RAW_TOPIC_PATTERNS = {
+    "exam": r"(?:exam|test|quiz|midterm|final)",
+    "study": r"(?:study|studying|learn|revision)",
+    "job": r"(?:job|interview|career|resume)",
 }
 
+# Keywords that ask for one of the interactive tools, checked in this order
+_RAW_TOOL_PATTERNS = {
+    "tips": r"tips?|help|coping|strategies|advice",
+    "breathe": r"breath|breathing|calm|relax",
+    "ground": r"ground|grounding|present",
+    "affirmation": r"affirmation|remind me|support|encouragement",
+}
+
+_NAME_RE = re.compile(r"(?:my name is|i am|i\'m|call me|this is)\s+([A-Za-z]{1,15})", re.IGNORECASE)
+
+_NAME_BLOCKLIST = frozenset({
+    "feeling", "sad", "happy", "angry", "good", "bad", "fine", "okay", "well",
+    "great", "terrible", "stressed", "tired", "confused", "lost", "studying",
+    "working", "learning", "thinking", "going", "doing", "lonely", "excited",
+    "proud", "hurt", "scared", "anxious", "guilty",
+})
+
+# =============================
+# Fused Pattern Scan
+# =============================
+class ScanResult(NamedTuple):
+    priority: Tuple[str, ...]
+    emotions: Tuple[str, ...]
+    contexts: Tuple[str, ...]
+    topics: Tuple[str, ...]
+    tools: Tuple[str, ...]
+    intensity: float
+
+# Scan ids follow priority order, so sorting the hits puts the winning label first
+_SCAN_TABLE = [
+    (group, label, pattern)
+    for group, patterns in (
+        ("priority", _RAW_PRIORITY_INTENTS),
+        ("emotions", {e: _RAW_EMOTION_PATTERNS[e] for e in EMOTION_PRIORITY}),
+        ("contexts", _RAW_CONTEXT_PATTERNS),
+        ("topics", _RAW_TOPIC_PATTERNS),
+        ("tools", _RAW_TOOL_PATTERNS),
+        ("intensity", {word: re.escape(word) for word in INTENSITY_MODIFIERS}),
+    )
+    for label, pattern in patterns.items()
+]
+
+def _build_scan_database():
+    """Compile all patterns into one Hyperscan database, or None to use `re`"""
+    if hyperscan is None:
+        return None
+    flags = hyperscan.HS_FLAG_CASELESS | hyperscan.HS_FLAG_SINGLEMATCH
+    try:
+        db = hyperscan.Database()
+        db.compile(
+            expressions=[pattern.encode("utf-8") for _, _, pattern in _SCAN_TABLE],
+            ids=list(range(len(_SCAN_TABLE))),
+            elements=len(_SCAN_TABLE),
+            flags=[flags] * len(_SCAN_TABLE),
+        )
+    except Exception:
+        return None
+    return db
+
+_SCAN_DB = _build_scan_database()
+
+def _union_pattern(patterns: Dict[str, str]) -> "re.Pattern":
+    """One regex for a whole group; each alternative is a named lookahead so overlaps aren't consumed"""
+    return re.compile("|".join(f"(?=(?P<{label}>{pattern}))" for label, pattern in patterns.items()), re.IGNORECASE)
+
+PRIORITY_RE = _union_pattern(_RAW_PRIORITY_INTENTS)
+EMOTION_RE = _union_pattern({e: _RAW_EMOTION_PATTERNS[e] for e in EMOTION_PRIORITY})
+CONTEXT_RE = _union_pattern(_RAW_CONTEXT_PATTERNS)
+TOPIC_RE = _union_pattern(_RAW_TOPIC_PATTERNS)
+TOOL_RE = _union_pattern(_RAW_TOOL_PATTERNS)
+
+def _scan_group(union_re: "re.Pattern", order: List[str], text_low: str) -> Tuple[str, ...]:
+    # At each position the first alternative (highest priority) that matches is reported,
+    # so the overall winner is always among the labels found
+    found = {m.lastgroup for m in union_re.finditer(text_low)}
+    return tuple(label for label in order if label in found)
+
+def detect_intensity(text_low: str) -> float:
+    """Weight of the first INTENSITY_MODIFIERS entry (in dict order) found in the text"""
+    found = [m.lastindex - 1 for m in _INTENSITY_RE.finditer(text_low)]
+    return INTENSITY_MODIFIERS[_INTENSITY_WORDS[min(found)]] if found else 1.0
+
+@lru_cache(maxsize=1024)
+def scan_message(text_low: str) -> ScanResult:
+    """Match every pattern group and intensity modifier against the message in a single pass.
+
+    Labels in each group come back in priority order, so the first one is the winner.
+    """
+    # Hyperscan evaluates \b on UTF-8 bytes, where accented letters count as non-word
+    # characters, so only ASCII text may take the Hyperscan path
+    if _SCAN_DB is None or not text_low.isascii():
+        return ScanResult(
+            priority=_scan_group(PRIORITY_RE, list(_RAW_PRIORITY_INTENTS), text_low),
+            emotions=_scan_group(EMOTION_RE, EMOTION_PRIORITY, text_low),
+            contexts=_scan_group(CONTEXT_RE, list(_RAW_CONTEXT_PATTERNS), text_low),
+            topics=_scan_group(TOPIC_RE, list(_RAW_TOPIC_PATTERNS), text_low),
+            tools=_scan_group(TOOL_RE, list(_RAW_TOOL_PATTERNS), text_low),
+            intensity=detect_intensity(text_low),
+        )
+
+    hits = set()
+
+    def on_match(pattern_id, start, end, flags, context):
+        hits.add(pattern_id)
+
+    _SCAN_DB.scan(text_low.encode("utf-8"), match_event_handler=on_match)
+    found: Dict[str, List[str]] = {"priority": [], "emotions": [], "contexts": [], "topics": [], "tools": [], "intensity": []}
+    for pattern_id in sorted(hits):
+        group, label, _ = _SCAN_TABLE[pattern_id]
+        found[group].append(label)
+    return ScanResult(
+        priority=tuple(found["priority"]),
+        emotions=tuple(found["emotions"]),
+        contexts=tuple(found["contexts"]),
+        topics=tuple(found["topics"]),
+        tools=tuple(found["tools"]),
+        intensity=INTENSITY_MODIFIERS[found["intensity"][0]] if found["intensity"] else 1.0,
+    )
+
+def load_embedder(name: str) -> Any:
+    """Load a static model2vec embedder or a SentenceTransformer, depending on the name"""
+    if name == STATIC_EMBED_MODEL_NAME:
+        from model2vec import StaticModel
+        return StaticModel.from_pretrained(name)
+
+    import torch
+    if os.environ.get(EMBED_CPU_ONLY_ENV) == "1" or not torch.cuda.is_available():
+        return SentenceTransformer(name, device="cpu")
+    return embedder_to_cuda(SentenceTransformer(name, device="cpu"))
+
+def embedder_to_cuda(embedder: SentenceTransformer) -> SentenceTransformer:
+    """Move a SentenceTransformer to the GPU, in place"""
+    # fp16 on GPU, unless it visibly moves the embedding of a fixed sentence
+    embedder.to("cuda")
+    reference = embedder.encode([FP16_SANITY_SENTENCE], show_progress_bar=False)[0]
+    embedder.half()
+    halved = embedder.encode([FP16_SANITY_SENTENCE], show_progress_bar=False)[0].astype(np.float32)
+    cosine = float(reference @ halved / max(float(np.linalg.norm(reference) * np.linalg.norm(halved)), 1e-12))
+    logger.info("fp16 embedder cosine vs fp32 on sanity sentence: %.5f", cosine)
+    if not cosine >= FP16_MIN_COSINE:
+        logger.warning("fp16 embeddings drifted (cosine %.5f); keeping the embedder in fp32", cosine)
+        embedder.float()
+    return embedder
+
+_thread_local = threading.local()
+
+def _rng() -> random.Random:
+    """Per-thread RNG so concurrent requests don't share the module-level generator"""
+    rng = getattr(_thread_local, "rng", None)
+    if rng is None:
+        rng = _thread_local.rng = random.Random(os.urandom(8))
+    return rng
+
+def pick(options: Sequence[str]) -> str:
+    """Random element by direct index, without random.choice's per-call checks"""
+    return options[_rng().randrange(len(options))]
+
 def safe_lower(text: str) -> str:
     return text.lower().strip()
 
 def simple_name_extractor(text: str) -> Optional[str]:
     """Extract names ONLY from explicit introductions"""
-    text_low = text.lower().strip()
-
-    blocklist = ["feeling", "sad", "happy", "angry", "good", "bad", "fine", "okay", "well",
-                 "great", "terrible", "stressed", "tired", "confused", "lost", "studying",
-                 "working", "learning", "thinking", "going", "doing", "lonely", "excited",
-                 "proud", "hurt", "scared", "anxious", "guilty"]
-
-    patterns = [
-        r"my name is ([A-Za-z]{1,15})",
-        r"i am ([A-Za-z]{1,15})",
-        r"i\'m ([A-Za-z]{1,15})",
-        r"call me ([A-Za-z]{1,15})",
-        r"this is ([A-Za-z]{1,15})",
-    ]
-
-    for p in patterns:
-        m = re.search(p, text, re.IGNORECASE)
-        if m:
-            potential_name = m.group(1).strip().title()
-            if potential_name.lower() not in blocklist:
-                return potential_name
+    for m in _NAME_RE.finditer(text):
+        potential_name = m.group(1).strip().title()
+        if potential_name.lower() not in _NAME_BLOCKLIST:
+            return potential_name
     return None
 
 # =============================
-# Interactive Content
+# Training
 # =============================
-class InteractiveContent:
-    @staticmethod
-    def generate_breathing_exercise() -> str:
-        exercises = [
-            "**Box Breathing (4-4-4-4)**\n\nLet\'s do this together:\n✓ Breathe IN → 1...2...3...4\n✓ HOLD → 1...2...3...4\n✓ Breathe OUT → 1...2...3...4\n✓ HOLD → 1...2...3...4\n\nRepeat 4 times. Ready? Start now!\nTell me how you feel after!",
-            "**4-7-8 Calming Breath**\n\nThis activates your relaxation response:\n✓ IN through nose → 4 seconds\n✓ HOLD → 7 seconds\n✓ OUT through mouth → 8 seconds\n\nDo this 3 times. I\'ll wait...\nHow do you feel now?",
-            "**Simple Deep Breathing**\n\nLet\'s ground you:\n✓ Take a slow, deep breath in → 5 seconds\n✓ Hold it gently → 2 seconds\n✓ Release slowly → 5 seconds\n\nRepeat 5 times. Focus only on your breath.\nReady? Start...",
+def encode_sorted(embedder: Any, sentences: List[str], batch_size: int = 1024) -> np.ndarray:
+    """Encode in length-sorted minibatches so each batch only pads to its own longest sentence"""
+    order = np.argsort([len(s.split()) for s in sentences], kind="stable")
+    embeddings = embedder.encode([sentences[i] for i in order], batch_size=batch_size, show_progress_bar=False)
+    embeddings = np.asarray(embeddings)
+    unsorted = np.empty_like(embeddings)
+    unsorted[order] = embeddings
+    return unsorted
+
+def load_classifier(weights_file: str, classes_file: str) -> Tuple[LogisticRegression, LabelEncoder]:
+    """Rebuild a fitted LogisticRegression and LabelEncoder from raw numpy arrays"""
+    with np.load(weights_file) as weights:
+        classifier = LogisticRegression()
+        classifier.coef_ = weights["coef"]
+        classifier.intercept_ = weights["intercept"]
+        classifier.classes_ = weights["classes"]
+        classifier.n_features_in_ = classifier.coef_.shape[1]
+
+    label_encoder = LabelEncoder()
+    label_encoder.classes_ = np.load(classes_file, mmap_mode="r")
+    return classifier, label_encoder
+
+def train_intent_model(texts: List[str], labels: List[str], embed_name: str = ACTIVE_EMBED_MODEL_NAME):
+    """Fit the intent classifier and class centroids, then write them to ARTIFACTS_DIR"""
+    embedder = load_embedder(embed_name)
+    X = encode_sorted(embedder, texts)
+
+    label_encoder = LabelEncoder()
+    y = label_encoder.fit_transform(labels)
+    classifier = LogisticRegression(max_iter=1000)
+    classifier.fit(X, y)
+
+    centroid_labels = [str(label) for label in label_encoder.classes_]
+    centroids = np.vstack([X[y == i].mean(axis=0) for i in range(len(centroid_labels))])
+    # Stored L2-normalized so cosine similarity at inference is a single matvec
+    centroids = (centroids / np.linalg.norm(centroids, axis=1, keepdims=True)).astype(np.float32)
+
+    np.savez(
+        CLASSIFIER_WEIGHTS_FILE,
+        coef=classifier.coef_,
+        intercept=classifier.intercept_,
+        classes=classifier.classes_,
+    )
+    np.save(LABEL_CLASSES_FILE, label_encoder.classes_.astype(str))
+    np.save(CENTROIDS_FILE, centroids)
+    with open(CENTROID_LABELS_FILE, "w") as f:
+        json.dump(centroid_labels, f)
+    with open(EMBEDDER_NAME_FILE, "w") as f:
+        f.write(embed_name)
+
+    return classifier, label_encoder
+
+# =============================
+# Embedding Batcher
+# =============================
+class EmbeddingBatcher:
+    """Coalesce concurrent single-text encode calls into one batched forward pass"""
+
+    def __init__(self, embedder: Any, max_batch: int = 32, max_wait_ms: float = 5.0, timeout: float = 60.0):
+        self.embedder = embedder
+        self.max_batch = max_batch
+        self.max_wait = max_wait_ms / 1000.0
+        # Upper bound on one encode call, so a stuck worker fails requests instead of hanging them
+        self.timeout = timeout
+        self._queue: "queue.Queue[Tuple[str, Future]]" = queue.Queue()
+        self._lock = threading.Lock()
+        self._worker: Optional[threading.Thread] = None
+        self._worker_pid: Optional[int] = None
+
+    def encode(self, text: str) -> np.ndarray:
+        self._ensure_worker()
+        future: Future = Future()
+        self._queue.put((text, future))
+        return future.result(timeout=self.timeout)
+
+    def _worker_running(self) -> bool:
+        return self._worker is not None and self._worker_pid == os.getpid() and self._worker.is_alive()
+
+    def _ensure_worker(self):
+        # Threads do not survive fork, so a preloaded app starts one per worker process;
+        # a worker that died is replaced and picks up whatever is still queued
+        if self._worker_running():
+            return
+        with self._lock:
+            if not self._worker_running():
+                if self._worker_pid != os.getpid():
+                    self._queue = queue.Queue()
+                self._worker = threading.Thread(target=self._run, daemon=True)
+                self._worker_pid = os.getpid()
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            try:
+                embeddings = self.embedder.encode(
+                    [text for text, _ in batch], batch_size=self.max_batch, show_progress_bar=False
+                )
+                embeddings = np.asarray(embeddings, dtype=np.float32)
+                if len(embeddings) != len(batch):
+                    raise RuntimeError(f"embedder returned {len(embeddings)} rows for {len(batch)} texts")
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+# =============================
+# Emotion History
+# =============================
+EMOTION_HISTORY_SIZE = 20
+CONVERSATION_CONTEXT_SIZE = 10
+# Small integer codes for the history arrays; 0 means "none"
+EMOTION_TO_ID = {emotion: i for i, emotion in enumerate(_RAW_EMOTION_PATTERNS, start=1)}
+ID_TO_EMOTION = [None] + list(_RAW_EMOTION_PATTERNS)
+_SENTIMENT_LABELS = [None, "Positive", "Negative", "Neutral"]
+_SENTIMENT_TO_ID = {label: i for i, label in enumerate(_SENTIMENT_LABELS) if label}
+# Emotions that make get_emotional_insight suggest reaching out
+_INSIGHT_NEGATIVE_IDS = np.array([EMOTION_TO_ID[e] for e in ("sad", "anxious", "lonely", "overwhelmed", "hopeless")], dtype=np.int8)
+
+
+MOOD_MIN, MOOD_MAX = -10, 10
+MOOD_STATES = ("very_negative", "negative", "neutral", "positive", "very_positive")
+_MOOD_EMOJIS = ("😢", "😟", "😐", "🙂", "😊")
+_SENTIMENT_MOOD_DELTA = {"Positive": 1, "Negative": -1}
+
+
+def clamp_mood(score: int) -> int:
+    return MOOD_MIN if score < MOOD_MIN else MOOD_MAX if score > MOOD_MAX else score
+
+
+class EmotionHistory:
+    """Ring buffer of the last turns' emotion, intensity, mood and sentiment, one array per field"""
+
+    def __init__(self, capacity: int = EMOTION_HISTORY_SIZE):
+        self.capacity = capacity
+        self.emotion_ids = np.zeros(capacity, dtype=np.int8)
+        self.intensities = np.zeros(capacity, dtype=np.float64)  # float64 so saved values round-trip exactly
+        self.mood_scores = np.zeros(capacity, dtype=np.int8)
+        self.sentiment_ids = np.zeros(capacity, dtype=np.int8)
+        self.timestamps = np.zeros(capacity, dtype=np.int64)  # time.time_ns()
+        self._next = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, emotion: Optional[str], intensity: float, mood_score: int,
+               sentiment: Optional[str], timestamp_ns: int):
+        i = self._next
+        self.emotion_ids[i] = EMOTION_TO_ID.get(emotion, 0)
+        self.intensities[i] = intensity
+        self.mood_scores[i] = mood_score
+        self.sentiment_ids[i] = _SENTIMENT_TO_ID.get(sentiment, 0)
+        self.timestamps[i] = timestamp_ns
+        self._next = (i + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def _order(self, n: Optional[int] = None) -> np.ndarray:
+        """Buffer positions of the last n records, oldest first"""
+        n = self._size if n is None else min(n, self._size)
+        return np.arange(self._next - n, self._next) % self.capacity
+
+    def recent_emotion_ids(self, n: int) -> np.ndarray:
+        return self.emotion_ids[self._order(n)]
+
+    def to_list(self) -> List[Dict[str, Any]]:
+        return [
+            {
+                "timestamp": datetime.fromtimestamp(self.timestamps[i] / 1e9, tz=timezone.utc).isoformat(),
+                "emotion": ID_TO_EMOTION[self.emotion_ids[i]],
+                "intensity": float(self.intensities[i]),
+                "mood_score": int(self.mood_scores[i]),
+                "sentiment": _SENTIMENT_LABELS[self.sentiment_ids[i]],
+            }
+            for i in self._order()
         ]
-        return random.choice(exercises)
 
-    @staticmethod
-    def generate_grounding_exercise() -> str:
-        return "**5-4-3-2-1 Grounding Technique**\n\nThis brings you back to the present:\n\nName out loud:\n✓ **5 things** you can SEE around you\n✓ **4 things** you can TOUCH\n✓ **3 things** you can HEAR\n✓ **2 things** you can SMELL\n✓ **1 thing** you can TASTE\n\nTake your time. Tell me when you\'re done!"
+    @classmethod
+    def from_list(cls, records: List[Dict[str, Any]], capacity: int = EMOTION_HISTORY_SIZE) -> "EmotionHistory":
+        history = cls(capacity)
+        for record in records[-capacity:]:
+            try:
+                timestamp_ns = int(datetime.fromisoformat(record["timestamp"]).timestamp() * 1e9)
+            except (KeyError, TypeError, ValueError):
+                timestamp_ns = 0
+            history.append(record.get("emotion"), record.get("intensity", 1.0),
+                           record.get("mood_score", 0), record.get("sentiment"), timestamp_ns)
+        return history
 
-    @staticmethod
-    def generate_support_tips(emotion: str) -> str:
-        tips = {
-            "sad": """**When feeling sad:**
+# =============================
+# Interactive Content
+# =============================
+BREATHING_EXERCISES = (
+    "**Box Breathing (4-4-4-4)**\n\nLet\'s do this together:\n✓ Breathe IN → 1...2...3...4\n✓ HOLD → 1...2...3...4\n✓ Breathe OUT → 1...2...3...4\n✓ HOLD → 1...2...3...4\n\nRepeat 4 times. Ready? Start now!\nTell me how you feel after!",
+    "**4-7-8 Calming Breath**\n\nThis activates your relaxation response:\n✓ IN through nose → 4 seconds\n✓ HOLD → 7 seconds\n✓ OUT through mouth → 8 seconds\n\nDo this 3 times. I\'ll wait...\nHow do you feel now?",
+    "**Simple Deep Breathing**\n\nLet\'s ground you:\n✓ Take a slow, deep breath in → 5 seconds\n✓ Hold it gently → 2 seconds\n✓ Release slowly → 5 seconds\n\nRepeat 5 times. Focus only on your breath.\nReady? Start...",
+)
+
+SUPPORT_TIPS = {
+    "sad": """**When feeling sad:**
 - Allow yourself to feel it — it\'s okay to be sad
 - Talk to someone you trust
 - Do one small thing you enjoy
@@ -158,7 +553,7 @@ class InteractiveContent:
 
 Remember: This feeling is temporary. You\'re not alone.""",
 
-            "anxious": """**Managing anxiety:**
+    "anxious": """**Managing anxiety:**
 - Ground yourself → 5-4-3-2-1 technique
 - Deep breathing exercises
 - Move your body → walk, stretch, dance
@@ -168,7 +563,7 @@ Remember: This feeling is temporary. You\'re not alone.""",
 
 Say "breathe" for a guided exercise or "ground" for grounding!""",
 
-            "angry": """**Cooling down anger:**
+    "angry": """**Cooling down anger:**
 - Take a 5-minute break from the situation
 - Count to 10 (or 100!) slowly
 - Physical release → push-ups, punching pillow
@@ -178,7 +573,7 @@ Say "breathe" for a guided exercise or "ground" for grounding!""",
 
 Your anger is valid. Let\'s work through it together.""",
 
-            "lonely": """**When feeling lonely:**
+    "lonely": """**When feeling lonely:**
 - Reach out to one person → text, call
 - Join an online community → hobby, interest
 - Go somewhere public → café, park
@@ -188,7 +583,7 @@ Your anger is valid. Let\'s work through it together.""",
 Remember: being alone ≠ being lonely.
 I\'m here with you right now. You\'re not alone.""",
 
-            "overwhelmed": """**When overwhelmed:**
+    "overwhelmed": """**When overwhelmed:**
 1. STOP. Take 3 deep breaths
 2. Write EVERYTHING down
 3. Pick ONE thing. Just one.
@@ -200,7 +595,7 @@ You don\'t have to do it all at once. One step at a time.
 
 What\'s the ONE thing you can do right now?""",
 
-            "hopeless": """**Feeling hopeless is so hard.**
+    "hopeless": """**Feeling hopeless is so hard.**
 
 Please talk to someone NOW → friend, family, counselor
 
@@ -215,7 +610,7 @@ Call a helpline if you need immediate support:
 
 You matter. Your life matters. I\'m here.""",
 
-            "tired": """**Dealing with exhaustion:**
+    "tired": """**Dealing with exhaustion:**
 - It\'s okay to rest — you\'re not lazy
 - Take a 10-20 min power nap
 - Move your body → even 5 min walk
@@ -225,7 +620,7 @@ You matter. Your life matters. I\'m here.""",
 
 Rest is productive. You deserve it.""",
 
-            "guilty": """**Managing guilt:**
+    "guilty": """**Managing guilt:**
 - Ask: "Did I intend harm?" (Usually no)
 - Apologize if you hurt someone
 - Forgive yourself — everyone makes mistakes
@@ -235,7 +630,7 @@ Rest is productive. You deserve it.""",
 
 You\'re human. Mistakes don\'t define you.""",
 
-            "proud": """**CELEBRATE YOUR WIN!**
+    "proud": """**CELEBRATE YOUR WIN!**
 ✓ Tell someone about it!
 ✓ Write down what you did well
 ✓ Give yourself credit — you earned it
@@ -243,44 +638,378 @@ You\'re human. Mistakes don\'t define you.""",
 ✓ Remember this moment for tough days
 
 You should be proud. This is awesome!""",
-        }
-        return tips.get(emotion, "I\'m here to support you. Tell me more about what you\'re feeling.")
+}
+
+DEFAULT_SUPPORT_TIP = "I\'m here to support you. Tell me more about what you\'re feeling."
+
+AFFIRMATIONS = {
+    "sad": (
+        "It\'s okay to not be okay right now. This feeling will pass.",
+        "Your sadness is valid. You don\'t have to force positivity.",
+        "Even in darkness, you are still here. That takes strength.",
+    ),
+    "anxious": (
+        "You\'ve survived every anxious moment before this. You\'ll survive this too.",
+        "Anxiety lies. You are more capable than your worry says.",
+        "One breath at a time. You\'ve got this.",
+    ),
+    "lonely": (
+        "Being alone doesn\'t mean you\'re unworthy of connection.",
+        "You matter, even when you can\'t feel it.",
+        "This loneliness is temporary. Connection is still possible.",
+    ),
+    "overwhelmed": (
+        "You don\'t have to do it all. One step is enough.",
+        "It\'s okay to ask for help. It\'s actually brave.",
+        "You\'re doing the best you can with what you have.",
+    ),
+    "insecure": (
+        "You are enough, exactly as you are.",
+        "Your worth isn\'t determined by what you achieve.",
+        "Everyone feels this way sometimes. You\'re not broken.",
+    ),
+    "tired": (
+        "Rest is not giving up. It\'s refueling.",
+        "You\'re allowed to be tired without feeling guilty.",
+        "Taking care of yourself is NOT selfish.",
+    ),
+}
+
+DEFAULT_AFFIRMATIONS = ("You\'re doing great. Keep going.",)
+
+class InteractiveContent:
+    @staticmethod
+    def generate_breathing_exercise() -> str:
+        return pick(BREATHING_EXERCISES)
+
+    @staticmethod
+    def generate_grounding_exercise() -> str:
+        return "**5-4-3-2-1 Grounding Technique**\n\nThis brings you back to the present:\n\nName out loud:\n✓ **5 things** you can SEE around you\n✓ **4 things** you can TOUCH\n✓ **3 things** you can HEAR\n✓ **2 things** you can SMELL\n✓ **1 thing** you can TASTE\n\nTake your time. Tell me when you\'re done!"
+
+    @staticmethod
+    def generate_support_tips(emotion: str) -> str:
+        return SUPPORT_TIPS.get(emotion, DEFAULT_SUPPORT_TIP)
 
     @staticmethod
     def generate_affirmation(emotion: str) -> str:
-        affirmations = {
-            "sad": [
-                "It\'s okay to not be okay right now. This feeling will pass.",
-                "Your sadness is valid. You don\'t have to force positivity.",
-                "Even in darkness, you are still here. That takes strength.",
-            ],
-            "anxious": [
-                "You\'ve survived every anxious moment before this. You\'ll survive this too.",
-                "Anxiety lies. You are more capable than your worry says.",
-                "One breath at a time. You\'ve got this.",
-            ],
-            "lonely": [
-                "Being alone doesn\'t mean you\'re unworthy of connection.",
-                "You matter, even when you can\'t feel it.",
-                "This loneliness is temporary. Connection is still possible.",
-            ],
-            "overwhelmed": [
-                "You don\'t have to do it all. One step is enough.",
-                "It\'s okay to ask for help. It\'s actually brave.",
-                "You\'re doing the best you can with what you have.",
-            ],
-            "insecure": [
-                "You are enough, exactly as you are.",
-                "Your worth isn\'t determined by what you achieve.",
-                "Everyone feels this way sometimes. You\'re not broken.",
-            ],
-            "tired": [
-                "Rest is not giving up. It\'s refueling.",
-                "You\'re allowed to be tired without feeling guilty.",
-                "Taking care of yourself is NOT selfish.",
-            ],
-        }
-        return random.choice(affirmations.get(emotion, ["You\'re doing great. Keep going."]))
+        return pick(AFFIRMATIONS.get(emotion, DEFAULT_AFFIRMATIONS))
+
+# =============================
+# Response Tables
+# =============================
+# Context responses: (emotions that must accompany the context or None for any, templates, suffix)
+CONTEXT_RESPONSES: Dict[str, Tuple[Optional[frozenset], Tuple[str, ...], Optional[str]]] = {
+    "breakup": (
+        None,
+        (
+            "Breakups cut deep, especially when it\'s someone you really cared about. {name_prefix}What hurts the most right now?",
+            "That sounds incredibly painful. When someone we love walks away, it feels like the ground\'s been pulled from under us. {name_prefix}Do you want to tell me what happened?",
+            "I hear you. Losing a relationship can feel devastating. {name_prefix}How are you holding up? What\'s going through your mind?",
+            "{intensity_prefix}the pain of the breakup. It\'s one of the hardest things to go through. You don\'t have to be strong right now — it\'s okay to hurt. Want to talk about it?",
+            "When someone leaves, it\'s normal to feel shattered. {name_prefix}I\'m here. Do you want to talk about how it ended, or just how you\'re feeling?",
+        ),
+        "\n\n💙 *Say \'tips\' for healing strategies or \'breathe\' to calm down.*",
+    ),
+    "family_issue": (
+        frozenset({"angry", "hurt", "sad"}),
+        (
+            "Family conflicts hit different — they\'re so personal. {name_prefix}What happened? I\'m listening.",
+            "Arguments with family can be especially painful because we care so much. {name_prefix}Want to talk about what\'s going on?",
+            "{intensity_prefix}the tension with your family. That\'s exhausting. What happened?",
+        ),
+        None,
+    ),
+    "academic_stress": (
+        frozenset({"anxious", "overwhelmed", "scared"}),
+        (
+            "Academic pressure can be crushing. {name_prefix}What\'s got you stressed? Maybe we can break it down together.",
+            "{intensity_prefix}the exam anxiety. That racing mind before a test is rough. When\'s the exam? How are you preparing?",
+            "School stress is no joke. {name_prefix}Tell me what\'s overwhelming you — assignments, exams, grades? Let\'s tackle it.",
+        ),
+        None,
+    ),
+    "job_stress": (
+        frozenset({"anxious", "overwhelmed", "angry", "insecure"}),
+        (
+            "Work stress can bleed into everything. {name_prefix}What\'s happening at your job? Tell me more.",
+            "{intensity_prefix}the pressure from work. That can be draining. What\'s going on?",
+            "Job stuff is tough — it affects so much of our lives. {name_prefix}Want to vent about what\'s bothering you?",
+        ),
+        None,
+    ),
+}
+
+# Emotion responses: (templates, suffix); templates use str.format placeholders
+EMOTION_RESPONSES: Dict[str, Tuple[Tuple[str, ...], Optional[str]]] = {
+    "sad": (
+        (
+            "{intensity_prefix}you\'re feeling sad{name_suffix}. That\'s really tough. What\'s weighing on you? I\'m here.",
+            "{intensity_prefix}the sadness in your words. Want to talk about what happened? Sometimes it helps.",
+            "I\'m sorry you\'re going through this{name_suffix}. Sadness is hard. What\'s making you feel this way?",
+            "It\'s okay to not be okay. {name_prefix}Tell me what\'s on your heart.",
+        ),
+        "\n\n💙 *Say \'tips\' for coping strategies, \'breathe\' for calming, or \'affirmation\' for support.*",
+    ),
+    "anxious": (
+        (
+            "{intensity_prefix}the anxiety{name_suffix}. That\'s really uncomfortable. What\'s making you feel anxious right now?",
+            "Anxiety is tough to sit with. {name_prefix}I\'m here. Want to talk about what\'s worrying you?",
+            "{intensity_prefix}you\'re feeling on edge. That\'s exhausting. What\'s going through your mind?",
+            "Racing thoughts? Tight chest? Anxiety\'s the worst. {name_prefix}Talk to me — what\'s triggering this?",
+        ),
+        "\n\n💙 *Try \'breathe\' for exercise, \'ground\' for grounding, or \'tips\' for strategies.*",
+    ),
+    "angry": (
+        (
+            "{intensity_prefix}you\'re angry{name_suffix}. That\'s valid — anger tells us something matters. What happened?",
+            "I hear the frustration. It\'s okay to be mad. {name_prefix}Want to vent about what\'s pissing you off?",
+            "{intensity_prefix}the anger in your words. You have every right to feel this way. What\'s going on?",
+            "Sometimes we just need to let it out. {name_prefix}I\'m listening — tell me what happened.",
+        ),
+        "\n\n💙 *Say \'tips\' for anger management, or just keep talking — I\'m listening.*",
+    ),
+    "lonely": (
+        (
+            "{intensity_prefix}you\'re feeling lonely{name_suffix}. That\'s one of the hardest feelings. You\'re not alone right now — I\'m here. What\'s making you feel this way?",
+            "Loneliness is so painful. {name_prefix}I\'m with you. Want to talk about it?",
+            "I hear you. Feeling alone is heavy{name_suffix}. Tell me more.",
+            "Being lonely doesn\'t mean you\'re unlovable — it just means you\'re human. {name_prefix}I\'m here. Talk to me.",
+        ),
+        "\n\n💙 *Say \'tips\' for connection ideas, or just chat — I\'m here for you.*",
+    ),
+    "overwhelmed": (
+        (
+            "{intensity_prefix}you\'re overwhelmed{name_suffix}. That\'s a lot to carry. Let\'s break it down — what\'s the biggest thing on your mind?",
+            "Feeling overwhelmed is exhausting. {name_prefix}I\'m here. What\'s making you feel buried?",
+            "Too much at once can be suffocating. {name_prefix}Let\'s tackle this together — what\'s one thing stressing you most?",
+            "When everything piles up, it\'s hard to breathe. {name_prefix}Talk to me — what\'s overwhelming you?",
+        ),
+        "\n\n💙 *Say \'tips\' for overwhelm strategies.*",
+    ),
+    "hopeless": (
+        (
+            """{intensity_prefix}you\'re feeling hopeless{name_suffix}. I\'m really concerned. That\'s such a heavy feeling.
+
+Please reach out to someone right now:
+• A friend or family member
+• A counselor or therapist
+• iCALL: 9152987821 (call/WhatsApp)
+• Local crisis helpline
+
+These feelings are real but they\'re NOT the truth. You matter. Your life matters. I\'m here too.
+
+What\'s making you feel this way? Let\'s talk.""",
+        ),
+        None,
+    ),
+    "guilty": (
+        (
+            "{intensity_prefix}you\'re carrying guilt{name_suffix}. That\'s a heavy burden. What happened that\'s making you feel this way?",
+            "Guilt can be so consuming. {name_prefix}Want to talk about what you\'re feeling bad about? I won\'t judge.",
+            "I hear the guilt. You\'re being hard on yourself. {name_prefix}What\'s going on?",
+        ),
+        "\n\n💙 *Say \'tips\' for managing guilt, or \'affirmation\' for support.*",
+    ),
+    "jealous": (
+        (
+            "{intensity_prefix}you\'re feeling jealous. That\'s honest and real. {name_prefix}What\'s making you feel this way?",
+            "Jealousy is uncomfortable but it\'s human. {name_prefix}Want to talk about what\'s triggering this?",
+            "I hear you. Comparison can be painful. What\'s going on?",
+        ),
+        "\n\n💙 Sometimes jealousy shows us what we want. Let\'s explore that.",
+    ),
+    "disappointed": (
+        (
+            "{intensity_prefix}you\'re disappointed. That stings. {name_prefix}What didn\'t go the way you hoped?",
+            "Disappointment hurts{name_suffix}. I\'m sorry. What happened?",
+            "I hear the letdown. That\'s tough. Want to talk about it?",
+        ),
+        None,
+    ),
+    "hurt": (
+        (
+            "{intensity_prefix}you\'re hurt. That\'s painful, especially when it comes from someone you care about. {name_prefix}What happened?",
+            "Feeling hurt is one of the deepest pains. {name_prefix}I\'m here. Who or what hurt you?",
+            "I\'m sorry you\'re feeling hurt. That\'s real pain. Want to talk about it?",
+        ),
+        None,
+    ),
+    "scared": (
+        (
+            "{intensity_prefix}you\'re scared. Fear is so uncomfortable. {name_prefix}What\'s frightening you?",
+            "I hear the fear. That\'s a real feeling. Want to talk about what\'s scaring you?",
+            "Being scared is hard. {name_prefix}You\'re safe talking to me. What\'s going on?",
+        ),
+        "\n\n💙 *Say \'breathe\' for calming, or \'ground\' to feel present.*",
+    ),
+    "confused": (
+        (
+            "{intensity_prefix}you\'re confused. That\'s disorienting. {name_prefix}What\'s unclear? Maybe talking it through will help.",
+            "Confusion is uncomfortable. Let\'s untangle this together — what\'s puzzling you?",
+            "I hear the confusion. Sometimes talking helps clarify. What\'s on your mind?",
+        ),
+        None,
+    ),
+    "tired": (
+        (
+            "{intensity_prefix}you\'re exhausted. That\'s draining. {name_prefix}What\'s wearing you out?",
+            "Being tired — physically or emotionally — is real. What\'s taking your energy?",
+            "I hear you\'re drained. Burnout is no joke. What\'s going on?",
+        ),
+        "\n\n💙 *Say \'tips\' for energy restoration.*",
+    ),
+    "insecure": (
+        (
+            "{intensity_prefix}you\'re feeling insecure. Those thoughts can be so loud. {name_prefix}What\'s making you doubt yourself?",
+            "Insecurity is painful. You\'re not alone in feeling this. What\'s triggering it?",
+            "I hear the self-doubt. That\'s hard. Want to talk about what\'s making you feel not good enough?",
+        ),
+        "\n\n💙 *Say \'affirmation\' for a reminder of your worth.*",
+    ),
+    "numb": (
+        (
+            "{intensity_prefix}you\'re feeling numb or empty. That disconnection is real. {name_prefix}What\'s going on?",
+            "Emotional numbness can be a sign you\'re overwhelmed. I\'m here. What happened?",
+            "Feeling nothing can be scarier than feeling pain. Want to talk about what led to this?",
+        ),
+        None,
+    ),
+    "happy": (
+        (
+            "{intensity_prefix}you\'re happy! That\'s wonderful! {name_prefix}What\'s bringing you joy?",
+            "I love hearing this! What\'s making you feel good?",
+            "Yes! Happiness looks good on you! Tell me what happened!",
+        ),
+        None,
+    ),
+    "excited": (
+        (
+            "{intensity_prefix}you\'re excited! I can feel the energy! {name_prefix}What\'s happening?!",
+            "That excitement is contagious! Tell me everything!",
+            "Yes! What are you pumped about?!",
+        ),
+        None,
+    ),
+    "proud": (
+        (
+            "{intensity_prefix}you\'re proud — and you SHOULD be! {name_prefix}What did you accomplish?",
+            "Hell yes! Tell me what you achieved! You deserve to celebrate!",
+            "That\'s amazing! I\'m proud of you too! What happened?",
+        ),
+        "\n\n💙 *Say \'tips\' to make sure you really celebrate this win!*",
+    ),
+    "grateful": (
+        (
+            "{intensity_prefix}gratitude in your words. That\'s beautiful. {name_prefix}What are you thankful for?",
+            "Gratitude is powerful. What\'s making you feel blessed?",
+            "I love this energy. What happened that you\'re grateful for?",
+        ),
+        None,
+    ),
+    "relieved": (
+        (
+            "{intensity_prefix}you\'re relieved! That must feel like a weight lifted. {name_prefix}What resolved?",
+            "Phew! Relief is such a good feeling. What\'s finally over?",
+            "I can feel the exhale. What were you worried about that\'s now okay?",
+        ),
+        None,
+    ),
+    "loved": (
+        (
+            "{intensity_prefix}you\'re feeling loved and appreciated! That\'s so heartwarming! {name_prefix}Who\'s making you feel this way?",
+            "Being loved and valued is everything. Tell me more!",
+            "That\'s beautiful. Feeling cherished is so important. What happened?",
+        ),
+        None,
+    ),
+    "hopeful": (
+        (
+            "{intensity_prefix}you\'re feeling hopeful! That\'s such a positive shift! {name_prefix}What\'s giving you hope?",
+            "Hope is powerful. I\'m glad you\'re feeling this way. What changed?",
+            "Yes! Optimism looks good on you! What are you hopeful about?",
+        ),
+        None,
+    ),
+    "confident": (
+        (
+            "{intensity_prefix}you\'re feeling confident! That\'s amazing! {name_prefix}What\'s giving you this boost?",
+            "Yes! That confidence is showing! What are you ready for?",
+            "I love this energy! What\'s making you feel self-assured?",
+        ),
+        None,
+    ),
+    "bored": (
+        (
+            "{intensity_prefix}you\'re bored. That restlessness is real. {name_prefix}What would make things more interesting for you?",
+            "Boredom can be uncomfortable. Want suggestions for something to do, or just need to vent?",
+            "I hear you. Nothing capturing your interest? What usually excites you?",
+        ),
+        None,
+    ),
+    "nostalgic": (
+        (
+            "{intensity_prefix}you\'re feeling nostalgic. Memories can be bittersweet. {name_prefix}What are you remembering?",
+            "Nostalgia is that mix of happiness and longing. What\'s on your mind from the past?",
+            "I hear you looking back. What memory came up?",
+        ),
+        None,
+    ),
+    "curious": (
+        (
+            "{intensity_prefix}you\'re curious! I love that! {name_prefix}What do you want to know?",
+            "Curiosity is great! What\'s got you wondering?",
+            "I\'m intrigued! What question is on your mind?",
+        ),
+        None,
+    ),
+}
+
+EMPTY_INPUT_REPLY = "I\'m listening... what would you like to talk about?"
+
+FALLBACK_RESPONSES = (
+    "{name_prefix}I\'m listening. Tell me more?",
+    "{name_prefix}Interesting. What else is on your mind?",
+    "I\'m here. Keep going — what happened next?",
+    "I hear you. How does that make you feel?",
+    "That\'s important to you. Tell me more about that.",
+    "Go on. I\'m with you. What are you thinking?",
+    "{name_prefix}That sounds significant. Want to explore that more?",
+)
+
+# Side effects of some emotions on the relationship level and mood score
+EMOTION_RELATIONSHIP_BONUS = {"happy": 1, "excited": 1, "proud": 1, "grateful": 1, "loved": 2}
+EMOTION_MOOD_BONUS = {"hopeful": 2, "confident": 2}
+
+# Indexed by intensity_bucket(): mild, normal, strong
+_INTENSITY_PREFIXES = ("I hear ", "", "I can really sense ")
+
+
+def answered_by_tables(emotion: Optional[str], context: Optional[str]) -> bool:
+    """True if CONTEXT_RESPONSES or EMOTION_RESPONSES will reply, so the intent is never read"""
+    if context in CONTEXT_RESPONSES:
+        emotions = CONTEXT_RESPONSES[context][0]
+        if emotions is None or emotion in emotions:
+            return True
+    return emotion in EMOTION_RESPONSES
+
+
+def intensity_bucket(intensity: float) -> int:
+    if intensity >= 2.0:
+        return 2
+    if intensity <= 0.7:
+        return 0
+    return 1
+
+
+@lru_cache(maxsize=64)
+def reply_prefixes(username: str, bucket: int) -> Dict[str, str]:
+    """Placeholder values for the response templates; shared between calls, so never mutate the result"""
+    name_prefix = f"{username}, " if username else ""
+    return {
+        "name_prefix": name_prefix,
+        "name_suffix": (", " + name_prefix.rstrip(", ")) if name_prefix else "",
+        "intensity_prefix": _INTENSITY_PREFIXES[bucket],
+    }
 
 # =============================
 # Advanced Bot
@@ -288,19 +1017,22 @@ You should be proud. This is awesome!""",
 class AdvancedBot:
     def __init__(self, name: str = "J.A.R.V.I.S."):
         self.name = name
-        self.embedder: Optional[SentenceTransformer] = None
+        self.embedder: Optional[Any] = None
+        self.batcher: Optional[EmbeddingBatcher] = None
         self.classifier: Optional[LogisticRegression] = None
         self.label_encoder: Optional[LabelEncoder] = None
         self.class_centroids: Optional[np.ndarray] = None
         self.centroid_labels: Optional[List[str]] = None
+        self._fused: Optional[np.ndarray] = None
+        self._centroids_norm: Optional[np.ndarray] = None
 
         self.memory: Dict[str, Any] = {
             "username": None,
             "last_topic": None,
             "mood_score": 0,
             "mood_history": [],
-            "emotion_history": [],
-            "conversation_context": [],
+            "emotion_history": EmotionHistory(),
+            "conversation_context": deque(maxlen=CONVERSATION_CONTEXT_SIZE),
             "turn_count": 0,
             "awaiting_response": None,
             "last_emotion": None,
@@ -308,177 +1040,418 @@ class AdvancedBot:
             "relationship_level": 0,
         }
 
-        self.try_load_models()
+        # Chat traffic repeats itself ("hi", "thanks", "help me"); skip re-embedding identical texts
+        self._classify_cached = lru_cache(maxsize=4096)(self._classify_uncached)
+        # Results computed by generate_reply_batch, waiting to be moved into the cache
+        self._prefetched: Dict[str, Optional[Tuple[str, float]]] = {}
+
+        # Models load on first use (or via warm_up) so regex/heuristic turns never pay for torch
+        self._models_lock = threading.Lock()
+        self._models_loaded = False
         self.interactive = InteractiveContent()
 
+    def _ensure_models(self):
+        """Load the ML models once; concurrent callers wait for the same load"""
+        if self._models_loaded:
+            return
+        with self._models_lock:
+            if not self._models_loaded:
+                self.try_load_models()
+                self._models_loaded = True
+
+    def warm_up(self, background: bool = True):
+        """Load the ML models before the first message that needs them"""
+        if background:
+            threading.Thread(target=self._ensure_models, daemon=True).start()
+        else:
+            self._ensure_models()
+
+    def use_cuda(self):
+        """Move an embedder loaded on the CPU (e.g. in a preloading gunicorn master) to the GPU"""
+        import torch
+        if isinstance(self.embedder, SentenceTransformer) and torch.cuda.is_available():
+            embedder_to_cuda(self.embedder)
+
     def try_load_models(self):
         """Load ML models if available"""
-        if os.path.exists(EMBEDDER_NAME_FILE):
+        # One directory listing instead of a stat per artifact
+        try:
+            with os.scandir(ARTIFACTS_DIR) as it:
+                present = {entry.name for entry in it}
+        except OSError:
+            present = set()
+
+        def has(*files: str) -> bool:
+            return all(os.path.basename(f) in present for f in files)
+
+        if has(EMBEDDER_NAME_FILE):
             with open(EMBEDDER_NAME_FILE, "r") as f:
                 embed_name = f.read().strip()
             try:
-                self.embedder = SentenceTransformer(embed_name)
+                self.embedder = load_embedder(embed_name)
+                self.batcher = EmbeddingBatcher(self.embedder)
             except Exception:
                 self.embedder = None
 
-        if os.path.exists(CLASSIFIER_FILE) and os.path.exists(LABEL_ENCODER_FILE):
+        if has(CLASSIFIER_WEIGHTS_FILE, LABEL_CLASSES_FILE):
+            try:
+                self.classifier, self.label_encoder = load_classifier(CLASSIFIER_WEIGHTS_FILE, LABEL_CLASSES_FILE)
+            except Exception:
+                pass
+        elif has(CLASSIFIER_FILE, LABEL_ENCODER_FILE):
             try:
-                self.classifier = joblib.load(CLASSIFIER_FILE)
+                self.classifier = joblib.load(CLASSIFIER_FILE, mmap_mode="r")
                 self.label_encoder = joblib.load(LABEL_ENCODER_FILE)
             except Exception:
                 pass
 
-        if os.path.exists(CENTROIDS_FILE) and os.path.exists(CENTROID_LABELS_FILE):
+        if has(CENTROIDS_FILE, CENTROID_LABELS_FILE):
             try:
+                # Read once: _build_fused_scorer copies it into the fused matrix anyway
                 self.class_centroids = np.load(CENTROIDS_FILE)
                 with open(CENTROID_LABELS_FILE, "r") as f:
                     self.centroid_labels = json.load(f)
             except Exception:
                 pass
 
+        self._build_fused_scorer()
+        self._classify_cached.cache_clear()
+
+    def _memory_to_dict(self) -> Dict[str, Any]:
+        """Memory with the ring buffer and deque turned back into plain lists"""
+        return dict(
+            self.memory,
+            emotion_history=self.memory["emotion_history"].to_list(),
+            conversation_context=list(self.memory["conversation_context"]),
+        )
+
+    def _memory_from_dict(self, loaded: Dict[str, Any]):
+        self.memory.update(loaded)
+        self.memory["emotion_history"] = EmotionHistory.from_list(self.memory.get("emotion_history") or [])
+        self.memory["conversation_context"] = deque(
+            self.memory.get("conversation_context") or [], maxlen=CONVERSATION_CONTEXT_SIZE
+        )
+
+    def __getstate__(self) -> Dict[str, Any]:
+        # Only the conversation state travels; models reload lazily on the receiving side
+        return {"name": self.name, "memory": self._memory_to_dict()}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        self.__init__(name=state["name"])
+        self._memory_from_dict(state["memory"])
+
     def save_memory(self, path: str = "bot_memory.json"):
-        with open(path, "w", encoding="utf-8") as f:
-            json.dump(self.memory, f, ensure_ascii=False, indent=2)
+        memory = self._memory_to_dict()
+        if orjson is not None:
+            data = orjson.dumps(memory, option=orjson.OPT_INDENT_2 | orjson.OPT_SERIALIZE_NUMPY)
+        else:
+            data = json.dumps(memory, ensure_ascii=False, indent=2).encode("utf-8")
+
+        # Write beside the target and swap it in, so a crash never leaves a truncated memory file;
+        # each save gets its own temp file so concurrent saves cannot clobber each other
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except OSError:
+            os.unlink(tmp_path)
+            raise
 
     def load_memory(self, path: str = "bot_memory.json"):
         if os.path.exists(path):
-            with open(path, "r", encoding="utf-8") as f:
-                loaded = json.load(f)
-                self.memory.update(loaded)
+            with open(path, "rb") as f:
+                data = f.read()
+            loaded = orjson.loads(data) if orjson is not None else json.loads(data)
+            self._memory_from_dict(loaded)
 
-    def detect_emotion_with_intensity(self, text: str) -> Tuple[Optional[str], float]:
+    def detect_emotion_with_intensity(self, text: str, scan: Optional[ScanResult] = None) -> Tuple[Optional[str], float]:
         """Detect emotion and its intensity"""
-        text_low = safe_lower(text)
-
-        intensity = 1.0
-        for modifier, weight in INTENSITY_MODIFIERS.items():
-            if modifier in text_low:
-                intensity = weight
-                break
+        if scan is None:
+            scan = scan_message(safe_lower(text))
 
-        detected_emotions = []
-        for emotion, pattern in EMOTION_PATTERNS.items():
-            if re.search(pattern, text_low):
-                detected_emotions.append(emotion)
+        intensity = scan.intensity
+        detected_emotions = scan.emotions
 
         if detected_emotions:
-            negative = ["sad", "angry", "anxious", "lonely", "guilty", "hurt", "scared", 
-                       "disappointed", "overwhelmed", "hopeless", "insecure", "numb"]
-            for emo in negative:
-                if emo in detected_emotions:
-                    return emo, intensity
             return detected_emotions[0], intensity
 
         return None, 1.0
 
-    def detect_context(self, text: str) -> Optional[str]:
+    def detect_context(self, text: str, scan: Optional[ScanResult] = None) -> Optional[str]:
         """Detect specific life context"""
-        text_low = safe_lower(text)
-        for context, pattern in CONTEXT_PATTERNS.items():
-            if re.search(pattern, text_low):
-                return context
-        return None
+        if scan is None:
+            scan = scan_message(safe_lower(text))
+        return scan.contexts[0] if scan.contexts else None
 
     def update_mood(self, sentiment_label: Optional[str], emotion: Optional[str], intensity: float = 1.0):
         """Update mood with intensity consideration"""
+        delta = 0
         if emotion:
-            negative_emotions = ["sad", "angry", "anxious", "lonely", "guilty", "hurt", "scared", 
-                                "disappointed", "overwhelmed", "hopeless", "insecure"]
-            positive_emotions = ["happy", "excited", "proud", "grateful", "relieved", "loved", 
-                                "hopeful", "confident"]
-
-            if emotion in negative_emotions:
-                self.memory["mood_score"] = max(-10, self.memory["mood_score"] - int(3 * intensity))
-            elif emotion in positive_emotions:
-                self.memory["mood_score"] = min(10, self.memory["mood_score"] + int(3 * intensity))
+            if emotion in NEGATIVE_EMOTIONS:
+                delta = -int(3 * intensity)
+            elif emotion in POSITIVE_EMOTIONS:
+                delta = int(3 * intensity)
 
         elif sentiment_label:
-            if sentiment_label == "Positive":
-                self.memory["mood_score"] = min(10, self.memory["mood_score"] + 1)
-            elif sentiment_label == "Negative":
-                self.memory["mood_score"] = max(-10, self.memory["mood_score"] - 1)
+            delta = _SENTIMENT_MOOD_DELTA.get(sentiment_label, 0)
 
-        self.memory["emotion_history"].append({
-            "timestamp": datetime.now().isoformat(),
-            "emotion": emotion,
-            "intensity": intensity,
-            "mood_score": self.memory["mood_score"],
-            "sentiment": sentiment_label
-        })
+        if delta:
+            self.memory["mood_score"] = clamp_mood(self.memory["mood_score"] + delta)
 
-        if len(self.memory["emotion_history"]) > 20:
-            self.memory["emotion_history"].pop(0)
+        self.memory["emotion_history"].append(
+            emotion, intensity, self.memory["mood_score"], sentiment_label, time.time_ns()
+        )
 
-    def get_mood_state(self) -> str:
+    def get_mood_level(self) -> int:
+        """Mood as an index into MOOD_STATES: 0 (very_negative) .. 4 (very_positive)"""
         score = self.memory["mood_score"]
         if score >= 7:
-            return "very_positive"
+            return 4
         elif score >= 3:
-            return "positive"
+            return 3
         elif score >= -2:
-            return "neutral"
+            return 2
         elif score >= -6:
-            return "negative"
+            return 1
         else:
-            return "very_negative"
+            return 0
+
+    def get_mood_state(self) -> str:
+        return MOOD_STATES[self.get_mood_level()]
 
     def get_emotional_insight(self) -> Optional[str]:
         """Provide insight based on emotional patterns"""
-        if len(self.memory["emotion_history"]) < 3:
+        history = self.memory["emotion_history"]
+        if len(history) < 3:
             return None
 
-        recent_emotions = [e["emotion"] for e in self.memory["emotion_history"][-5:] if e["emotion"]]
-        negative = ["sad", "anxious", "lonely", "overwhelmed", "hopeless"]
+        recent = history.recent_emotion_ids(5)
+        recent = recent[recent != 0]
 
-        if sum(1 for e in recent_emotions if e in negative) >= 3:
+        if np.count_nonzero(np.isin(recent, _INSIGHT_NEGATIVE_IDS)) >= 3:
             return "I\'m noticing you\'ve been going through a tough time. Have you considered talking to someone you trust or a professional? You don\'t have to carry this alone."
 
-        if len(set(recent_emotions)) >= 4 and len(recent_emotions) >= 4:
+        if recent.size >= 4 and np.unique(recent).size >= 4:
             return "I\'m noticing your emotions have been shifting quite a bit. That can be exhausting. Want to talk about what\'s causing these ups and downs?"
 
         return None
 
-    def check_priority_regex(self, text: str) -> Optional[str]:
-        t = safe_lower(text)
-        for intent, pattern in PRIORITY_INTENTS.items():
-            if re.search(pattern, t, flags=re.IGNORECASE):
-                return intent
-        return None
+    def check_priority_regex(self, text: str, scan: Optional[ScanResult] = None) -> Optional[str]:
+        if scan is None:
+            scan = scan_message(safe_lower(text))
+        return scan.priority[0] if scan.priority else None
 
-    def predict_intent(self, text: str) -> Dict[str, Any]:
-        pr = self.check_priority_regex(text)
+    def predict_intent(self, text: str, scan: Optional[ScanResult] = None, classify: bool = True) -> Dict[str, Any]:
+        if scan is None:
+            scan = scan_message(safe_lower(text))
+
+        pr = self.check_priority_regex(text, scan)
         if pr:
             return {"predicted_label": pr, "confidence": 1.0, "method": "regex"}
 
-        t = safe_lower(text)
-        if re.search(r"(exam|test|quiz|midterm|final)", t):
-            return {"predicted_label": "exam", "confidence": 0.7, "method": "heuristic"}
-        if re.search(r"(study|studying|learn|revision)", t):
-            return {"predicted_label": "study", "confidence": 0.7, "method": "heuristic"}
-        if re.search(r"(job|interview|career|resume)", t):
-            return {"predicted_label": "job", "confidence": 0.7, "method": "heuristic"}
+        if scan.topics:
+            return {"predicted_label": scan.topics[0], "confidence": 0.7, "method": "heuristic"}
+
+        classified = self.classify_intent(text) if classify else None
+        if classified:
+            return classified
 
         return {"predicted_label": "general", "confidence": 0.3, "method": "fallback"}
 
+    def _build_fused_scorer(self):
+        """Stack classifier weights over the centroids so one matvec yields logits and similarities"""
+        self._fused = None
+        self._centroids_norm = None
+        if self.class_centroids is None or not self.centroid_labels:
+            return
+        centroids = np.asarray(self.class_centroids, dtype=np.float32)
+        # Older artifacts stored raw class means; cosine scoring needs unit rows
+        centroids = centroids / np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-12)
+        self._centroids_norm = centroids
+        self._centroid_rows = {label: i for i, label in enumerate(self.centroid_labels)}
+        if self.classifier is None:
+            return
+
+        coef = np.asarray(self.classifier.coef_, dtype=np.float32)
+        self._fused = np.ascontiguousarray(np.vstack([coef, centroids]))
+        self._n_logits = coef.shape[0]
+        self._intercept = np.asarray(self.classifier.intercept_, dtype=np.float32)
+
+    def _score_embedding(self, q: np.ndarray) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+        """Class probabilities and centroid cosine similarities for one embedding"""
+        if self._fused is None:
+            return self.classifier.predict_proba(q[None, :])[0], None
+
+        out = self._fused @ q
+        logits = out[:self._n_logits] + self._intercept
+        if self._n_logits == 1:
+            p = 1.0 / (1.0 + np.exp(-logits[0]))
+            probs = np.array([1.0 - p, p])
+        else:
+            e = np.exp(logits - logits.max())
+            probs = e / e.sum()
+        sims = out[self._n_logits:] / max(float(np.linalg.norm(q)), 1e-12)
+        return probs, sims
+
+    def classify_by_centroid(self, embs: np.ndarray) -> Optional[np.ndarray]:
+        """Cosine similarity of each embedding row to every class centroid, shape (n, n_classes)"""
+        if self._centroids_norm is None:
+            return None
+        embs = np.asarray(embs, dtype=np.float32)
+        embs = embs / np.maximum(np.linalg.norm(embs, axis=1, keepdims=True), 1e-12)
+        return embs @ self._centroids_norm.T
+
+    def classify_intent(self, text: str) -> Optional[Dict[str, Any]]:
+        """Classify with the trained model; None if models are missing or the text looks out of domain"""
+        self._ensure_models()
+        if self.embedder is None or self.classifier is None or self.label_encoder is None:
+            return None
+
+        classified = self._classify_cached(text)
+        if classified is None:
+            return None
+        label, confidence = classified
+        return {"predicted_label": label, "confidence": confidence, "method": "classifier"}
+
+    def _classify_uncached(self, text: str) -> Optional[Tuple[str, float]]:
+        if text in self._prefetched:
+            return self._prefetched.pop(text)
+        return self._classify_embedding(self.batcher.encode(text))
+
+    def _classify_embedding(self, q: np.ndarray) -> Optional[Tuple[str, float]]:
+        probs, sims = self._score_embedding(q)
+        best = int(np.argmax(probs))
+        if probs[best] < SOFTMAX_OOD_THRESHOLD:
+            return None
+        label = str(self.label_encoder.inverse_transform([self.classifier.classes_[best]])[0])
+
+        if sims is not None and label in self._centroid_rows:
+            if sims[self._centroid_rows[label]] < COSINE_OOD_THRESHOLD:
+                return None
+
+        return label, float(probs[best])
+
+    def _needs_classifier(self, ut: str, scan: ScanResult) -> bool:
+        """Whether generate_reply will run the classifier for this (stripped, non-empty) message"""
+        if scan.priority or scan.topics:
+            return False
+        emotion, _ = self.detect_emotion_with_intensity(ut, scan)
+        context = self.detect_context(ut, scan)
+        if answered_by_tables(emotion, context):
+            return False
+        # Introductions are answered before intent prediction
+        return not (emotion is None and context is None and simple_name_extractor(ut))
+
+    def prefetch_intents(self, texts: List[str]):
+        """Classify every text that will reach the classifier with one length-sorted encode call"""
+        self._ensure_models()
+        if self.embedder is None or self.classifier is None or self.label_encoder is None:
+            return
+
+        pending = []
+        for text in texts:
+            ut = text.strip()
+            if ut and self._needs_classifier(ut, scan_message(safe_lower(ut))):
+                pending.append(ut)
+        pending = list(dict.fromkeys(pending))
+        if not pending:
+            return
+
+        embeddings = np.asarray(encode_sorted(self.embedder, pending, batch_size=64), dtype=np.float32)
+        self._prefetched.update(zip(pending, (self._classify_embedding(q) for q in embeddings)))
+        for ut in pending:
+            self._classify_cached(ut)
+            # Already-cached texts never consult _prefetched; drop their entries
+            self._prefetched.pop(ut, None)
+
+    def generate_reply_batch(self, texts: List[str], sentiments: Optional[List[Optional[str]]] = None) -> List[str]:
+        """Reply to several messages in order, embedding the ones that need the classifier together"""
+        if sentiments is None:
+            sentiments = [None] * len(texts)
+        self.prefetch_intents(texts)
+        return [self.generate_reply(text, sentiment) for text, sentiment in zip(texts, sentiments)]
+
+    # =============================
+    # Intent Handlers
+    # =============================
+    def _reply_greeting(self, name_prefix: str) -> str:
+        greeting_name = name_prefix.rstrip(", ")
+        if self.memory["relationship_level"] >= 5:
+            greetings = [
+                f"Hey {greeting_name}! Good to see you again! How are you feeling today?",
+                f"Hi {greeting_name}! Welcome back! What\'s going on with you?"
+            ]
+        else:
+            greetings = [
+                f"Hey {greeting_name}! How are you doing?",
+                f"Hi {greeting_name}! What\'s on your mind today?"
+            ]
+        return pick(greetings)
+
+    def _reply_bye(self, name_prefix: str) -> str:
+        self.memory["relationship_level"] = min(10, self.memory["relationship_level"] + 1)
+        bye_name = name_prefix.rstrip(", ")
+        return pick([
+            f"Take care of yourself{', ' + bye_name if bye_name else ''}! I'm here whenever you need me.",
+            f"Goodbye{' ' + bye_name if bye_name else ''}! Remember — you've got this. Come back anytime.",
+            "See you later! Be kind to yourself today."
+        ])
+
+    def _reply_thanks(self, name_prefix: str) -> str:
+        self.memory["relationship_level"] = min(10, self.memory["relationship_level"] + 1)
+        thanks_name = name_prefix.rstrip(", ")
+        return pick([
+            f"You're so welcome{' ' + thanks_name if thanks_name else ''}! Anything else I can help with?",
+            f"Happy to help{' ' + thanks_name if thanks_name else ''}! That's what I'm here for.",
+            "Anytime! Need anything else?"
+        ])
+
+    def _reply_exam(self, name_prefix: str) -> str:
+        self.memory["last_topic"] = "exam"
+        return f"{name_prefix}Exams can be stressful! Which subject or test are you preparing for? I can help with study plans, techniques, or just moral support."
+
+    def _reply_study(self, name_prefix: str) -> str:
+        self.memory["last_topic"] = "study"
+        return f"{name_prefix}Nice! What topic are you studying? I can:\n• Create a study plan\n• Quiz you\n• Share techniques (Pomodoro, active recall)\n\nWhat would help?"
+
+    def _reply_job(self, name_prefix: str) -> str:
+        self.memory["last_topic"] = "job"
+        return f"{name_prefix}Career stuff! What do you need?\n• Interview prep?\n• Resume help?\n• Career exploration?\n\nLet me know!"
+
+    INTENT_HANDLERS: Dict[str, Callable[["AdvancedBot", str], str]] = {
+        "greeting": _reply_greeting,
+        "bye": _reply_bye,
+        "thanks": _reply_thanks,
+        "exam": _reply_exam,
+        "study": _reply_study,
+        "job": _reply_job,
+    }
+
     def generate_reply(self, user_text: str, sentiment_label: Optional[str] = None) -> str:
         """Main reply generation with context-aware responses"""
         ut = user_text.strip()
         if not ut:
-            return "I\'m listening... what would you like to talk about?"
+            return EMPTY_INPUT_REPLY
 
-        emotion, intensity = self.detect_emotion_with_intensity(ut)
-        context = self.detect_context(ut)
+        scan = scan_message(safe_lower(ut))
+        emotion, intensity = self.detect_emotion_with_intensity(ut, scan)
+        context = self.detect_context(ut, scan)
         self.update_mood(sentiment_label, emotion, intensity)
-        mood_state = self.get_mood_state()
 
-        if emotion is None and context is None:
+        # Priority intents come straight from the scan, so self-harm never waits on
+        # name extraction or the embedding classifier
+        priority = self.check_priority_regex(ut, scan)
+
+        if emotion is None and context is None and priority != "self_harm":
             name = simple_name_extractor(ut)
             if name:
                 self.memory["username"] = name
                 self.memory["relationship_level"] = min(10, self.memory["relationship_level"] + 1)
                 return f"Nice to meet you, {name}! I\'m {self.name}. How are you doing today?"
 
-        intent_info = self.predict_intent(ut)
+        # Only embed the text when the reply actually depends on the intent
+        intent_info = self.predict_intent(ut, scan, classify=self._needs_classifier(ut, scan))
         intent = intent_info["predicted_label"]
 
         self.memory["turn_count"] += 1
@@ -490,22 +1463,14 @@ class AdvancedBot:
             "context": context,
             "sentiment": sentiment_label
         })
-        if len(self.memory["conversation_context"]) > 10:
-            self.memory["conversation_context"].pop(0)
 
-        username = self.memory.get("username", "")
-        name_prefix = f"{username}, " if username else ""
+        prefixes = reply_prefixes(self.memory.get("username") or "", intensity_bucket(intensity))
+        name_prefix = prefixes["name_prefix"]
 
         if emotion:
             self.memory["last_emotion"] = emotion
             self.memory["last_emotion_intensity"] = intensity
 
-        intensity_prefix = ""
-        if intensity >= 2.0:
-            intensity_prefix = "I can really sense "
-        elif intensity <= 0.7:
-            intensity_prefix = "I hear "
-
         # === PRIORITY: SELF-HARM ===
         if intent == "self_harm":
             return """I\'m deeply concerned about you. Your safety is THE most important thing.
@@ -520,352 +1485,58 @@ These feelings are overwhelming but they\'re NOT permanent. You deserve help and
 I\'m here too. Can you tell me what\'s happening?"""
 
         # === CONTEXT-SPECIFIC RESPONSES ===
-        if context == "breakup":
-            breakup_name = name_prefix.rstrip(", ")
-            responses = [
-                f"Breakups cut deep, especially when it\'s someone you really cared about. {name_prefix}What hurts the most right now?",
-                f"That sounds incredibly painful. When someone we love walks away, it feels like the ground\'s been pulled from under us. {name_prefix}Do you want to tell me what happened?",
-                f"I hear you. Losing a relationship can feel devastating. {name_prefix}How are you holding up? What\'s going through your mind?",
-                f"{intensity_prefix}the pain of the breakup. It\'s one of the hardest things to go through. You don\'t have to be strong right now — it\'s okay to hurt. Want to talk about it?",
-                f"When someone leaves, it\'s normal to feel shattered. {name_prefix}I\'m here. Do you want to talk about how it ended, or just how you\'re feeling?"
-            ]
-            return random.choice(responses) + "\n\n💙 *Say \'tips\' for healing strategies or \'breathe\' to calm down.*"
-
-        if context == "family_issue" and emotion in ["angry", "hurt", "sad"]:
-            responses = [
-                f"Family conflicts hit different — they\'re so personal. {name_prefix}What happened? I\'m listening.",
-                f"Arguments with family can be especially painful because we care so much. {name_prefix}Want to talk about what\'s going on?",
-                f"{intensity_prefix}the tension with your family. That\'s exhausting. What happened?"
-            ]
-            return random.choice(responses)
-
-        if context == "academic_stress" and emotion in ["anxious", "overwhelmed", "scared"]:
-            responses = [
-                f"Academic pressure can be crushing. {name_prefix}What\'s got you stressed? Maybe we can break it down together.",
-                f"{intensity_prefix}the exam anxiety. That racing mind before a test is rough. When\'s the exam? How are you preparing?",
-                f"School stress is no joke. {name_prefix}Tell me what\'s overwhelming you — assignments, exams, grades? Let\'s tackle it."
-            ]
-            return random.choice(responses)
-
-        if context == "job_stress" and emotion in ["anxious", "overwhelmed", "angry", "insecure"]:
-            responses = [
-                f"Work stress can bleed into everything. {name_prefix}What\'s happening at your job? Tell me more.",
-                f"{intensity_prefix}the pressure from work. That can be draining. What\'s going on?",
-                f"Job stuff is tough — it affects so much of our lives. {name_prefix}Want to vent about what\'s bothering you?"
-            ]
-            return random.choice(responses)
+        if context in CONTEXT_RESPONSES:
+            emotions, templates, suffix = CONTEXT_RESPONSES[context]
+            if emotions is None or emotion in emotions:
+                reply = pick(templates).format_map(prefixes)
+                return reply + suffix if suffix else reply
 
         # === EMOTION-BASED RESPONSES ===
-        # Pre-calculate name_suffix to avoid f-string issues
-        name_suffix = (", " + name_prefix.rstrip(", ")) if name_prefix else ""
-
-        if emotion == "sad":
-            responses = [
-                f"{intensity_prefix}you\'re feeling sad{name_suffix}. That\'s really tough. What\'s weighing on you? I\'m here.",
-                f"{intensity_prefix}the sadness in your words. Want to talk about what happened? Sometimes it helps.",
-                f"I\'m sorry you\'re going through this{name_suffix}. Sadness is hard. What\'s making you feel this way?",
-                f"It\'s okay to not be okay. {name_prefix}Tell me what\'s on your heart."
-            ]
-            return random.choice(responses) + "\n\n💙 *Say \'tips\' for coping strategies, \'breathe\' for calming, or \'affirmation\' for support.*"
-
-        elif emotion == "anxious":
-            responses = [
-                f"{intensity_prefix}the anxiety{name_suffix}. That\'s really uncomfortable. What\'s making you feel anxious right now?",
-                f"Anxiety is tough to sit with. {name_prefix}I\'m here. Want to talk about what\'s worrying you?",
-                f"{intensity_prefix}you\'re feeling on edge. That\'s exhausting. What\'s going through your mind?",
-                f"Racing thoughts? Tight chest? Anxiety\'s the worst. {name_prefix}Talk to me — what\'s triggering this?"
-            ]
-            return random.choice(responses) + "\n\n💙 *Try \'breathe\' for exercise, \'ground\' for grounding, or \'tips\' for strategies.*"
-
-        elif emotion == "angry":
-            responses = [
-                f"{intensity_prefix}you\'re angry{name_suffix}. That\'s valid — anger tells us something matters. What happened?",
-                f"I hear the frustration. It\'s okay to be mad. {name_prefix}Want to vent about what\'s pissing you off?",
-                f"{intensity_prefix}the anger in your words. You have every right to feel this way. What\'s going on?",
-                f"Sometimes we just need to let it out. {name_prefix}I\'m listening — tell me what happened."
-            ]
-            return random.choice(responses) + "\n\n💙 *Say \'tips\' for anger management, or just keep talking — I\'m listening.*"
-
-        elif emotion == "lonely":
-            responses = [
-                f"{intensity_prefix}you\'re feeling lonely{name_suffix}. That\'s one of the hardest feelings. You\'re not alone right now — I\'m here. What\'s making you feel this way?",
-                f"Loneliness is so painful. {name_prefix}I\'m with you. Want to talk about it?",
-                f"I hear you. Feeling alone is heavy{name_suffix}. Tell me more.",
-                f"Being lonely doesn\'t mean you\'re unlovable — it just means you\'re human. {name_prefix}I\'m here. Talk to me."
-            ]
-            return random.choice(responses) + "\n\n💙 *Say \'tips\' for connection ideas, or just chat — I\'m here for you.*"
-
-        elif emotion == "overwhelmed":
-            responses = [
-                f"{intensity_prefix}you\'re overwhelmed{name_suffix}. That\'s a lot to carry. Let\'s break it down — what\'s the biggest thing on your mind?",
-                f"Feeling overwhelmed is exhausting. {name_prefix}I\'m here. What\'s making you feel buried?",
-                f"Too much at once can be suffocating. {name_prefix}Let\'s tackle this together — what\'s one thing stressing you most?",
-                f"When everything piles up, it\'s hard to breathe. {name_prefix}Talk to me — what\'s overwhelming you?"
-            ]
-            return random.choice(responses) + "\n\n💙 *Say \'tips\' for overwhelm strategies.*"
-
-        elif emotion == "hopeless":
-            self.memory["mood_score"] = -10
-            return f"""{intensity_prefix}you\'re feeling hopeless{name_suffix}. I\'m really concerned. That\'s such a heavy feeling.
-
-Please reach out to someone right now:
-• A friend or family member
-• A counselor or therapist
-• iCALL: 9152987821 (call/WhatsApp)
-• Local crisis helpline
-
-These feelings are real but they\'re NOT the truth. You matter. Your life matters. I\'m here too.
-
-What\'s making you feel this way? Let\'s talk."""
-
-        elif emotion == "guilty":
-            responses = [
-                f"{intensity_prefix}you\'re carrying guilt{name_suffix}. That\'s a heavy burden. What happened that\'s making you feel this way?",
-                f"Guilt can be so consuming. {name_prefix}Want to talk about what you\'re feeling bad about? I won\'t judge.",
-                f"I hear the guilt. You\'re being hard on yourself. {name_prefix}What\'s going on?"
-            ]
-            return random.choice(responses) + "\n\n💙 *Say \'tips\' for managing guilt, or \'affirmation\' for support.*"
-
-        elif emotion == "jealous":
-            responses = [
-                f"{intensity_prefix}you\'re feeling jealous. That\'s honest and real. {name_prefix}What\'s making you feel this way?",
-                f"Jealousy is uncomfortable but it\'s human. {name_prefix}Want to talk about what\'s triggering this?",
-                f"I hear you. Comparison can be painful. What\'s going on?"
-            ]
-            return random.choice(responses) + "\n\n💙 Sometimes jealousy shows us what we want. Let\'s explore that."
-
-        elif emotion == "disappointed":
-            responses = [
-                f"{intensity_prefix}you\'re disappointed. That stings. {name_prefix}What didn\'t go the way you hoped?",
-                f"Disappointment hurts{name_suffix}. I\'m sorry. What happened?",
-                f"I hear the letdown. That\'s tough. Want to talk about it?"
-            ]
-            return random.choice(responses)
-
-        elif emotion == "hurt":
-            responses = [
-                f"{intensity_prefix}you\'re hurt. That\'s painful, especially when it comes from someone you care about. {name_prefix}What happened?",
-                f"Feeling hurt is one of the deepest pains. {name_prefix}I\'m here. Who or what hurt you?",
-                f"I\'m sorry you\'re feeling hurt. That\'s real pain. Want to talk about it?"
-            ]
-            return random.choice(responses)
-
-        elif emotion == "scared":
-            responses = [
-                f"{intensity_prefix}you\'re scared. Fear is so uncomfortable. {name_prefix}What\'s frightening you?",
-                f"I hear the fear. That\'s a real feeling. Want to talk about what\'s scaring you?",
-                f"Being scared is hard. {name_prefix}You\'re safe talking to me. What\'s going on?"
-            ]
-            return random.choice(responses) + "\n\n💙 *Say \'breathe\' for calming, or \'ground\' to feel present.*"
-
-        elif emotion == "confused":
-            responses = [
-                f"{intensity_prefix}you\'re confused. That\'s disorienting. {name_prefix}What\'s unclear? Maybe talking it through will help.",
-                f"Confusion is uncomfortable. Let\'s untangle this together — what\'s puzzling you?",
-                f"I hear the confusion. Sometimes talking helps clarify. What\'s on your mind?"
-            ]
-            return random.choice(responses)
-
-        elif emotion == "tired":
-            responses = [
-                f"{intensity_prefix}you\'re exhausted. That\'s draining. {name_prefix}What\'s wearing you out?",
-                f"Being tired — physically or emotionally — is real. What\'s taking your energy?",
-                f"I hear you\'re drained. Burnout is no joke. What\'s going on?"
-            ]
-            return random.choice(responses) + "\n\n💙 *Say \'tips\' for energy restoration.*"
-
-        elif emotion == "insecure":
-            responses = [
-                f"{intensity_prefix}you\'re feeling insecure. Those thoughts can be so loud. {name_prefix}What\'s making you doubt yourself?",
-                f"Insecurity is painful. You\'re not alone in feeling this. What\'s triggering it?",
-                f"I hear the self-doubt. That\'s hard. Want to talk about what\'s making you feel not good enough?"
-            ]
-            return random.choice(responses) + "\n\n💙 *Say \'affirmation\' for a reminder of your worth.*"
-
-        elif emotion == "numb":
-            responses = [
-                f"{intensity_prefix}you\'re feeling numb or empty. That disconnection is real. {name_prefix}What\'s going on?",
-                f"Emotional numbness can be a sign you\'re overwhelmed. I\'m here. What happened?",
-                f"Feeling nothing can be scarier than feeling pain. Want to talk about what led to this?"
-            ]
-            return random.choice(responses)
-
-        # === POSITIVE EMOTIONS ===
-        elif emotion == "happy":
-            self.memory["relationship_level"] = min(10, self.memory["relationship_level"] + 1)
-            responses = [
-                f"{intensity_prefix}you\'re happy! That\'s wonderful! {name_prefix}What\'s bringing you joy?",
-                f"I love hearing this! What\'s making you feel good?",
-                f"Yes! Happiness looks good on you! Tell me what happened!"
-            ]
-            return random.choice(responses)
-
-        elif emotion == "excited":
-            self.memory["relationship_level"] = min(10, self.memory["relationship_level"] + 1)
-            responses = [
-                f"{intensity_prefix}you\'re excited! I can feel the energy! {name_prefix}What\'s happening?!",
-                f"That excitement is contagious! Tell me everything!",
-                f"Yes! What are you pumped about?!"
-            ]
-            return random.choice(responses)
-
-        elif emotion == "proud":
-            self.memory["relationship_level"] = min(10, self.memory["relationship_level"] + 1)
-            responses = [
-                f"{intensity_prefix}you\'re proud — and you SHOULD be! {name_prefix}What did you accomplish?",
-                f"Hell yes! Tell me what you achieved! You deserve to celebrate!",
-                f"That\'s amazing! I\'m proud of you too! What happened?"
-            ]
-            return random.choice(responses) + "\n\n💙 *Say \'tips\' to make sure you really celebrate this win!*"
-
-        elif emotion == "grateful":
-            self.memory["relationship_level"] = min(10, self.memory["relationship_level"] + 1)
-            responses = [
-                f"{intensity_prefix}gratitude in your words. That\'s beautiful. {name_prefix}What are you thankful for?",
-                f"Gratitude is powerful. What\'s making you feel blessed?",
-                f"I love this energy. What happened that you\'re grateful for?"
-            ]
-            return random.choice(responses)
-
-        elif emotion == "relieved":
-            responses = [
-                f"{intensity_prefix}you\'re relieved! That must feel like a weight lifted. {name_prefix}What resolved?",
-                f"Phew! Relief is such a good feeling. What\'s finally over?",
-                f"I can feel the exhale. What were you worried about that\'s now okay?"
-            ]
-            return random.choice(responses)
-
-        elif emotion == "loved":
-            self.memory["relationship_level"] = min(10, self.memory["relationship_level"] + 2)
-            responses = [
-                f"{intensity_prefix}you\'re feeling loved and appreciated! That\'s so heartwarming! {name_prefix}Who\'s making you feel this way?",
-                f"Being loved and valued is everything. Tell me more!",
-                f"That\'s beautiful. Feeling cherished is so important. What happened?"
-            ]
-            return random.choice(responses)
-
-        elif emotion == "hopeful":
-            self.memory["mood_score"] = min(10, self.memory["mood_score"] + 2)
-            responses = [
-                f"{intensity_prefix}you\'re feeling hopeful! That\'s such a positive shift! {name_prefix}What\'s giving you hope?",
-                f"Hope is powerful. I\'m glad you\'re feeling this way. What changed?",
-                f"Yes! Optimism looks good on you! What are you hopeful about?"
-            ]
-            return random.choice(responses)
-
-        elif emotion == "confident":
-            self.memory["mood_score"] = min(10, self.memory["mood_score"] + 2)
-            responses = [
-                f"{intensity_prefix}you\'re feeling confident! That\'s amazing! {name_prefix}What\'s giving you this boost?",
-                f"Yes! That confidence is showing! What are you ready for?",
-                f"I love this energy! What\'s making you feel self-assured?"
-            ]
-            return random.choice(responses)
-
-        # === NEUTRAL/COMPLEX EMOTIONS ===
-        elif emotion == "bored":
-            responses = [
-                f"{intensity_prefix}you\'re bored. That restlessness is real. {name_prefix}What would make things more interesting for you?",
-                f"Boredom can be uncomfortable. Want suggestions for something to do, or just need to vent?",
-                f"I hear you. Nothing capturing your interest? What usually excites you?"
-            ]
-            return random.choice(responses)
-
-        elif emotion == "nostalgic":
-            responses = [
-                f"{intensity_prefix}you\'re feeling nostalgic. Memories can be bittersweet. {name_prefix}What are you remembering?",
-                f"Nostalgia is that mix of happiness and longing. What\'s on your mind from the past?",
-                f"I hear you looking back. What memory came up?"
-            ]
-            return random.choice(responses)
-
-        elif emotion == "curious":
-            responses = [
-                f"{intensity_prefix}you\'re curious! I love that! {name_prefix}What do you want to know?",
-                f"Curiosity is great! What\'s got you wondering?",
-                f"I\'m intrigued! What question is on your mind?"
-            ]
-            return random.choice(responses)
+        if emotion in EMOTION_RESPONSES:
+            if emotion == "hopeless":
+                self.memory["mood_score"] = MOOD_MIN
+            if emotion in EMOTION_RELATIONSHIP_BONUS:
+                self.memory["relationship_level"] = min(10, self.memory["relationship_level"] + EMOTION_RELATIONSHIP_BONUS[emotion])
+            if emotion in EMOTION_MOOD_BONUS:
+                self.memory["mood_score"] = clamp_mood(self.memory["mood_score"] + EMOTION_MOOD_BONUS[emotion])
+
+            templates, suffix = EMOTION_RESPONSES[emotion]
+            template = templates[0] if len(templates) == 1 else pick(templates)
+            reply = template.format_map(prefixes)
+            return reply + suffix if suffix else reply
 
         # === INTENT-BASED RESPONSES ===
-        if intent == "greeting":
-            greeting_name = name_prefix.rstrip(", ")
-            if self.memory["relationship_level"] >= 5:
-                greetings = [
-                    f"Hey {greeting_name}! Good to see you again! How are you feeling today?",
-                    f"Hi {greeting_name}! Welcome back! What\'s going on with you?"
-                ]
-            else:
-                greetings = [
-                    f"Hey {greeting_name}! How are you doing?",
-                    f"Hi {greeting_name}! What\'s on your mind today?"
-                ]
-            return random.choice(greetings)
-
-        if intent == "bye":
-            self.memory["relationship_level"] = min(10, self.memory["relationship_level"] + 1)
-            bye_name = name_prefix.rstrip(", ")
-            return random.choice([
-                f"Take care of yourself{', ' + bye_name if bye_name else ''}! I'm here whenever you need me.",
-                f"Goodbye{' ' + bye_name if bye_name else ''}! Remember — you've got this. Come back anytime.",
-                "See you later! Be kind to yourself today."
-            ])
-
-        if intent == "thanks":
-            self.memory["relationship_level"] = min(10, self.memory["relationship_level"] + 1)
-            thanks_name = name_prefix.rstrip(", ")
-            return random.choice([
-                f"You're so welcome{' ' + thanks_name if thanks_name else ''}! Anything else I can help with?",
-                f"Happy to help{' ' + thanks_name if thanks_name else ''}! That's what I'm here for.",
-                "Anytime! Need anything else?"
-            ])
-
-        if intent == "exam":
-            self.memory["last_topic"] = "exam"
-            return f"{name_prefix}Exams can be stressful! Which subject or test are you preparing for? I can help with study plans, techniques, or just moral support."
-
-        if intent == "study":
-            self.memory["last_topic"] = "study"
-            return f"{name_prefix}Nice! What topic are you studying? I can:\n• Create a study plan\n• Quiz you\n• Share techniques (Pomodoro, active recall)\n\nWhat would help?"
-
-        if intent == "job":
-            self.memory["last_topic"] = "job"
-            return f"{name_prefix}Career stuff! What do you need?\n• Interview prep?\n• Resume help?\n• Career exploration?\n\nLet me know!"
+        handler = self.INTENT_HANDLERS.get(intent)
+        if handler:
+            return handler(self, name_prefix)
 
         # === EMOTIONAL INSIGHT ===
         insight = self.get_emotional_insight()
-        if insight and random.random() < 0.3:
+        if insight and _rng().random() < 0.3:
             return insight
 
         # === TOOL TRIGGERS ===
-        if re.search(r"tips?|help|coping|strategies|advice", ut, re.IGNORECASE):
-            if self.memory.get("last_emotion") in EMOTION_PATTERNS.keys():
+        if "tips" in scan.tools:
+            if self.memory.get("last_emotion") in EMOTION_KEYS:
                 return self.interactive.generate_support_tips(self.memory["last_emotion"])
 
-        if re.search(r"breath|breathing|calm|relax", ut, re.IGNORECASE):
+        if "breathe" in scan.tools:
             return self.interactive.generate_breathing_exercise()
 
-        if re.search(r"ground|grounding|present", ut, re.IGNORECASE):
+        if "ground" in scan.tools:
             return self.interactive.generate_grounding_exercise()
 
-        if re.search(r"affirmation|remind me|support|encouragement", ut, re.IGNORECASE):
+        if "affirmation" in scan.tools:
             if self.memory.get("last_emotion"):
                 return self.interactive.generate_affirmation(self.memory["last_emotion"])
 
         # === IMPROVED FALLBACK ===
-        fallbacks = [
-            f"{name_prefix}I\'m listening. Tell me more?",
-            f"{name_prefix}Interesting. What else is on your mind?",
-            f"I\'m here. Keep going — what happened next?",
-            f"I hear you. How does that make you feel?",
-            f"That\'s important to you. Tell me more about that.",
-            f"Go on. I\'m with you. What are you thinking?",
-            f"{name_prefix}That sounds significant. Want to explore that more?"
-        ]
-        return random.choice(fallbacks)
+        return pick(FALLBACK_RESPONSES).format_map(prefixes)
 
     def respond(self, user_text: str, sentiment_label: Optional[str] = None) -> str:
         """Wrapper to generate reply"""
+        if not user_text or user_text.isspace():
+            return EMPTY_INPUT_REPLY
         try:
             reply = self.generate_reply(user_text, sentiment_label=sentiment_label)
             self.memory["conversation_context"].append({"bot": reply})
@@ -876,8 +1547,47 @@ What\'s making you feel this way? Let\'s talk."""
 # =============================
 # Main
 # =============================
+# Rough sentiment hint for the REPL, which runs without VADER
+_REPL_POSITIVE_WORDS = frozenset({
+    "happy", "happier", "happiest", "great", "awesome", "amazing", "love", "loved", "loves", "loving",
+    "lovely", "excited", "exciting", "proud",
+})
+_REPL_NEGATIVE_WORDS = frozenset({
+    "sad", "sadder", "sadness", "depressed", "depressing", "angry", "upset", "stressed", "stressful",
+    "anxious", "terrible", "awful", "lonely", "loneliness", "hurt", "hurts", "hurting",
+})
+_WORD_RE = re.compile(r"[a-z]+")
+
+
+def repl_sentiment_hint(text_low: str) -> Optional[str]:
+    """Label by whichever keyword set has more hits in the lowercased text; a tie goes to Negative"""
+    positive = negative = 0
+    for token in _WORD_RE.findall(text_low):
+        if token in _REPL_POSITIVE_WORDS:
+            positive += 1
+        elif token in _REPL_NEGATIVE_WORDS:
+            negative += 1
+    if negative and negative >= positive:
+        return "Negative"
+    if positive:
+        return "Positive"
+    return None
+
+
+_EXIT_COMMANDS = frozenset({"exit", "quit"})
+
+
+def _parse_repl_input(u: str) -> Tuple[bool, Optional[str]]:
+    """(is an exit command, sentiment hint) for one stripped REPL line"""
+    u_lower = u.lower()
+    if u_lower in _EXIT_COMMANDS:
+        return True, None
+    return False, repl_sentiment_hint(u_lower)
+
+
 if __name__ == "__main__":
     bot = AdvancedBot(name="J.A.R.V.I.S.")
+    bot.warm_up()
     bot.load_memory()
 
     print(f"{bot.name} is ready with emotional intelligence!")
@@ -894,27 +1604,14 @@ if __name__ == "__main__":
         if not u:
             continue
 
-        if u.lower() in ["exit", "quit"]:
+        is_exit, sentiment = _parse_repl_input(u)
+        if is_exit:
             print(f"{bot.name}: {bot.respond('bye')}")
             bot.save_memory()
             break
 
-        sentiment = None
-        if re.search(r"(happy|great|awesome|amazing|love|excited|proud)", u, re.IGNORECASE):
-            sentiment = "Positive"
-        if re.search(r"(sad|depressed|angry|upset|stressed|anxious|terrible|awful|lonely|hurt)", u, re.IGNORECASE):
-            sentiment = "Negative"
-
         reply = bot.respond(u, sentiment_label=sentiment)
 
-        mood_emoji = {
-            "very_positive": "😊",
-            "positive": "🙂",
-            "neutral": "😐",
-            "negative": "😟",
-            "very_negative": "😢"
-        }
-        mood_state = bot.get_mood_state()
-        mood_indicator = mood_emoji.get(mood_state, "")
+        mood_indicator = _MOOD_EMOJIS[bot.get_mood_level()]
 
         print(f"{bot.name} {mood_indicator}: {reply}\n")
\ No newline at end of file
@@ -1,36 +1,69 @@
-from dataclasses import dataclass, field
-from datetime import datetime
+from array import array
+from dataclasses import dataclass
+from datetime import datetime, timezone
+import time
+import numpy as np
 from . import sentiment
 
-@dataclass
+# Order of the VADER scores kept in Exchange.scores
+SCORE_KEYS=sentiment.SCORE_KEYS
+
+@dataclass(slots=True)
 class Exchange:
     timestamp:datetime
     user:str
     bot:str
     sentiment:str=None
-    sentiment_scores:dict=field(default_factory=dict)
+    scores:tuple=()
+
+    @property
+    def sentiment_scores(self):
+        return dict(zip(SCORE_KEYS,self.scores))
 
 class ConversationManager:
     def __init__(self):
-        self.hist=[]
+        self.clear()
 
     def add_exchange(self,u,b,sentiment_analysis=None):
-        self.hist.append(Exchange(
-            timestamp=datetime.utcnow(),
-            user=u,
-            bot=b,
-            sentiment=sentiment_analysis["label"],
-            sentiment_scores=sentiment_analysis["scores"]
-        ))
+        if sentiment_analysis is None:
+            sentiment_analysis=sentiment.analyze_text(u)
+        scores=sentiment_analysis["scores"]
+        self._timestamps.append(time.time_ns())
+        self._users.append(u)
+        self._bots.append(b)
+        self._labels.append(sentiment_analysis["label"])
+        self._scores.extend(scores[k] for k in SCORE_KEYS)
+        self._compound_sum+=scores["compound"]
 
     def get_user_messages(self):
-        return [h.user for h in self.hist]
+        return self._users
+
+    def timestamp(self,i):
+        return datetime.fromtimestamp(self._timestamps[i]/1e9,tz=timezone.utc)
 
     def get_history(self):
-        return self.hist
+        return [
+            Exchange(timestamp=self.timestamp(i),user=u,bot=b,sentiment=l,scores=tuple(self._scores[4*i:4*i+4]))
+            for i,(u,b,l) in enumerate(zip(self._users,self._bots,self._labels))
+        ]
 
-    def summarize_overall_sentiment(self):
-        return sentiment.analyze_conversation(self.get_user_messages())
+    def summarize_overall_sentiment(self,per_message=True):
+        avg=self._compound_sum/len(self._users) if self._users else 0.0
+        summary={"average_compound":avg,"final_label":sentiment.compound_label(avg)}
+        if per_message:
+            scores=np.frombuffer(self._scores,dtype=np.float64).reshape(-1,len(SCORE_KEYS)).tolist()
+            summary["per_message"]=[
+                {"scores":dict(zip(SCORE_KEYS,row)),"compound":row[3],"label":label}
+                for row,label in zip(scores,self._labels)
+            ]
+        return summary
 
     def clear(self):
-        self.hist=[]
+        # One list/array per field, so scans like get_user_messages touch only what they need
+        self._timestamps=array("q")  # time.time_ns()
+        self._users=[]
+        self._bots=[]
+        self._labels=[]
+        self._scores=array("d")  # SCORE_KEYS values, four per exchange
+        # Running total so the overall sentiment never re-scores old messages
+        self._compound_sum=0.0
@@ -0,0 +1,29 @@
+# gunicorn.conf.py
+# Usage: gunicorn -c gunicorn.conf.py app:app
+import os
+
+bind = os.environ.get("BIND", "127.0.0.1:5000")
+
+# Threaded workers overlap request I/O while the bot and VADER run.
+# Conversation memory lives in-process, so each extra worker keeps its own memory.
+worker_class = "gthread"
+workers = int(os.environ.get("WEB_CONCURRENCY", 1))
+threads = int(os.environ.get("GUNICORN_THREADS", 8))
+timeout = 120
+
+# Load the bot (and its embedder weights) once in the master; workers share them copy-on-write.
+preload_app = os.environ.get("PRELOAD_APP", "1") != "0"
+if preload_app:
+    # CUDA cannot be re-initialized in forked workers, so the master keeps the embedder on the CPU
+    os.environ["CHATBOT_EMBED_CPU_ONLY"] = "1"
+
+
+def post_fork(server, worker):
+    # Split the cores between workers so torch thread pools don't oversubscribe them
+    import torch
+    torch.set_num_threads(max(1, (os.cpu_count() or 1) // server.cfg.workers))
+    if preload_app:
+        # Each worker creates its own CUDA context (if there is a GPU) and moves the embedder there
+        os.environ.pop("CHATBOT_EMBED_CPU_ONLY", None)
+        from app import bot
+        bot.use_cuda()
@@ -1,33 +1,102 @@
 # sentiment.py
 # (Content truncated for brevity in this environment demonstration)
+import atexit
+import hashlib
+import json
+import os
+import tempfile
+from functools import lru_cache
+import numpy as np
 from nltk.sentiment.vader import SentimentIntensityAnalyzer
 import nltk
 
-try:
-    nltk.data.find("sentiment/vader_lexicon.zip")
-except LookupError:
-    nltk.download("vader_lexicon")
+# Built on first use, so importing the module doesn't read the lexicon (or download it)
+_analyzer = None
 
-analyzer = SentimentIntensityAnalyzer()
+def _get_analyzer():
+    global _analyzer
+    if _analyzer is None:
+        try:
+            nltk.data.find("sentiment/vader_lexicon.zip")
+        except LookupError:
+            nltk.download("vader_lexicon")
+        _analyzer = SentimentIntensityAnalyzer()
+    return _analyzer
 
-def analyze_text(text):
-    scores = analyzer.polarity_scores(text)
-    compound = scores['compound']
+SCORE_KEYS = ("neg", "neu", "pos", "compound")
+
+# Scores can be persisted across runs so common phrases never hit VADER after the first session.
+# Opt-in: the keys are an unkeyed digest of each message, and short messages can be recovered
+# by hashing guesses, so nothing is written unless SENTIMENT_CACHE_FILE names a file.
+CACHE_FILE = os.environ.get("SENTIMENT_CACHE_FILE") or None
+CACHE_LIMIT = 10000
+_disk_cache = None
+
+def _cache_key(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=16).hexdigest()
+
+def _get_disk_cache():
+    global _disk_cache
+    if _disk_cache is None:
+        _disk_cache = {}
+        if CACHE_FILE is None:
+            return _disk_cache
+        try:
+            with open(CACHE_FILE, "r", encoding="utf-8") as f:
+                loaded = json.load(f)
+            if isinstance(loaded, dict):
+                _disk_cache = loaded
+        except (OSError, ValueError):
+            pass
+        atexit.register(save_disk_cache)
+    return _disk_cache
+
+def save_disk_cache():
+    """Write the cache back to CACHE_FILE (if set) through a per-process temp file"""
+    if CACHE_FILE is None or not _disk_cache:
+        return
+    recent = dict(list(_disk_cache.items())[-CACHE_LIMIT:])
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(CACHE_FILE)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(recent, f)
+        os.replace(tmp_path, CACHE_FILE)
+    except OSError:
+        os.unlink(tmp_path)
+        raise
+
+def compound_label(compound):
     if compound > 0.05:
-        label = "Positive"
+        return "Positive"
     elif compound < -0.05:
-        label = "Negative"
+        return "Negative"
     else:
-        label = "Neutral"
-    return {"scores": scores, "compound": compound, "label": label}
+        return "Neutral"
+
+# VADER is deterministic, and chat repeats itself ("hi", "thanks", ...); keep immutable results per text
+@lru_cache(maxsize=4096)
+def _analyze_cached(text):
+    cache = _get_disk_cache()
+    key = _cache_key(text)
+    scores = cache.pop(key, None)
+    if scores is None:
+        polarity = _get_analyzer().polarity_scores(text)
+        scores = [polarity[k] for k in SCORE_KEYS]
+    # Re-inserting keeps the dict ordered by last use, so evicting the first key drops the stalest text
+    while len(cache) >= CACHE_LIMIT:
+        cache.pop(next(iter(cache)), None)
+    cache[key] = scores
+    compound = scores[3]
+    return tuple(zip(SCORE_KEYS, scores)), compound, compound_label(compound)
+
+def analyze_text(text):
+    scores, compound, label = _analyze_cached(text)
+    return {"scores": dict(scores), "compound": compound, "label": label}
 
 def analyze_conversation(msgs):
     results = [analyze_text(m) for m in msgs]
-    avg = sum(r["compound"] for r in results) / len(results)
-    if avg > 0.05:
-        label = "Positive"
-    elif avg < -0.05:
-        label = "Negative"
-    else:
-        label = "Neutral"
-    return {"per_message": results, "average_compound": avg, "final_label": label}
+    if not results:
+        return {"per_message": [], "average_compound": 0.0, "final_label": "Neutral"}
+    compounds = np.fromiter((r["compound"] for r in results), dtype=np.float64, count=len(results))
+    avg = float(compounds.mean())
+    return {"per_message": results, "average_compound": avg, "final_label": compound_label(avg)}